@@ -0,0 +1,121 @@
+import os
+import sys
+import pickle
+import hashlib
+import tempfile
+
+
+class ASTCache:
+    """
+    On-disk cache of parsed ASTs, keyed by the file content hash and the Python version.
+
+    Each entry is a pickled parse result (tree and skipped regions) stored under a
+    two-level directory layout. Analyses whose result depends only on the source
+    of a file can store it next to the tree under their own namespace. Reading an entry refreshes its modification time,
+    which is used as the recency for eviction:
+    once the cache grows past max_bytes, the least recently used entries are removed
+    until it is back under the low-water mark.
+
+    The size is tracked in memory, per process, and recomputed from disk whenever
+    this process has written more than the headroom between the low-water mark and
+    max_bytes since the last recount, so that writes made by other processes sharing
+    the directory (parse workers, concurrent scans) are accounted for too.
+    """
+
+    FORMAT_VERSION = 2  # Bump whenever the shape of the cached entries changes
+
+    def __init__(self, cache_dir=".ast_cache", max_bytes=1024 ** 3, low_water=0.8):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.low_water = low_water
+        # Trees produced by another interpreter version may differ, so it is part of the key
+        self.version_tag = f"{sys.implementation.cache_tag}-{pickle.HIGHEST_PROTOCOL}-{self.FORMAT_VERSION}".encode()
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+        self.refresh()
+
+    def refresh(self):
+        """Recount the size of the cache from disk."""
+        self.size = sum(size for _, _, size in self._entries())
+        self.unsynced = 0  # Bytes written by this process since the last recount
+
+    def key(self, source_code, namespace=""):
+        """Content address of a source file for the running interpreter, within a namespace."""
+        digest = hashlib.sha256(self.version_tag)
+        if namespace:
+            digest.update(b"\0" + namespace.encode() + b"\0")
+        digest.update(source_code.encode("utf-8", "surrogatepass"))
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key[2:] + ".pickle")
+
+    def _entries(self):
+        """Yield (path, last_used, size) for every entry currently on disk."""
+        for shard in os.scandir(self.cache_dir):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.name.endswith(".tmp"):
+                    continue  # Being written by put(), possibly in another process
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue  # Evicted by a concurrent run
+                yield entry.path, stat.st_mtime, stat.st_size
+
+    def get(self, source_code, namespace=""):
+        """Return the cached entry for this source, or None on a miss."""
+        path = self._path(self.key(source_code, namespace))
+        try:
+            with open(path, "rb") as cache_file:
+                entry = pickle.load(cache_file)
+            os.utime(path)  # Mark as recently used
+        except (OSError, EOFError, pickle.UnpicklingError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry
+
+    def put(self, source_code, entry, namespace=""):
+        """Store a parse result, evicting old entries if the byte budget is exceeded."""
+        path = self._path(self.key(source_code, namespace))
+        data = pickle.dumps(entry, protocol=pickle.HIGHEST_PROTOCOL)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temporary file first so concurrent readers never see a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as cache_file:
+                cache_file.write(data)
+            try:
+                replaced = os.path.getsize(path)  # Same source stored again, e.g. by another worker
+            except OSError:
+                replaced = 0
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Failed to write AST cache entry {path}: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+        self.size += len(data) - replaced
+        self.unsynced += len(data)
+        if self.unsynced > self.max_bytes * (1 - self.low_water):
+            self.refresh()
+        if self.size > self.max_bytes:
+            self.evict()
+
+    def evict(self):
+        """Remove least recently used entries until the cache is under the low-water mark."""
+        entries = sorted(self._entries(), key=lambda entry: entry[1])
+        self.size = sum(size for _, _, size in entries)
+        self.unsynced = 0
+        target = self.max_bytes * self.low_water
+        for path, _, size in entries:
+            if self.size <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self.size -= size
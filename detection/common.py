@@ -1,87 +1,918 @@
 import os
 import ast
 import re
+import fnmatch
+import bisect
+import tokenize
+import weakref
+import functools
+from collections import namedtuple
 import pandas 
 import pandas as pd
 import numpy
 from typing import Dict,List
+from .notebook import notebook_to_source
+from .gitobjects import GitObjectReader, list_tree, prefetch_blobs, resolve_commit, text_stream
+from .engine import *
 
 
-def generate_ast_for_file(file_path):
+def read_source(file_path):
+    if file_path.endswith(".ipynb"):
+        return notebook_to_source(file_path)[0]  # Code cells only
     with open(file_path, "r",encoding="utf-8") as source_file:
-        source_code = source_file.read()
-        tree = ast.parse(source_code)
-        return tree  # Return
+        return source_file.read()
 
 
+def parse_source(source_code, cache=None):
+    """
+    Parse source code, going through the on-disk AST cache when one is given.
 
-# Generate ASTs for the entire repository, excluding .ipynb_checkpoints directories
-def generate_asts_for_repo(repo_path):
-    trees = []  # List to store (file_path, tree) tuples
-    found_files = False
+    Sources with syntax errors are parsed in recovery mode. Returns a
+    (tree, skipped_regions) tuple, see parse_with_recovery.
+    """
+    if cache is not None:
+        entry = cache.get(source_code)
+        if entry is not None:
+            return entry
+    entry = parse_with_recovery(source_code)
+    if cache is not None:
+        cache.put(source_code, entry)
+    return entry
 
-    for root, dirs, files in os.walk(repo_path):
-        # Skip .ipynb_checkpoints directories
-        dirs[:] = [d for d in dirs if d != ".ipynb_checkpoints"]
-        for file in files:
-            if file.endswith(".py"):
-                found_files = True
-                file_path = os.path.join(root, file)
-                tree = generate_ast_for_file(file_path)
-                trees.append((file_path, tree))  # Store each file's path and AST tree
 
-    if not found_files:
-        print("No Python (.py) files found in the repository.")
+# Vendored dependencies, build output and generated code never contain the project's own ML calls
+DEFAULT_EXCLUDES = (
+    ".git", ".ipynb_checkpoints", "__pycache__", ".tox", ".nox",
+    "venv", ".venv", "site-packages", "node_modules", "build", "dist", "*.egg-info",
+    "*_pb2.py", "*_pb2_grpc.py",
+)
+MAX_FILE_SIZE = 1024 * 1024  # Bytes; larger .py files are almost always generated (not applied to notebooks)
+SOURCE_EXTENSIONS = (".py", ".ipynb")
+MAX_LINE_LENGTH = 10000  # Characters; longer lines mean minified or generated code
 
-    return trees  # Return the list of (file_path, tree) tuples
 
+def is_excluded(name, rel_path, exclude):
+    """Match a file or directory against glob patterns, by base name or by path relative to the repo."""
+    return any(fnmatch.fnmatch(name, pattern) or fnmatch.fnmatch(rel_path, pattern) for pattern in exclude)
 
 
-def generate_ast_for_repo(repo_path):
-    trees = []  # List to store individual AST trees for each file
-    found_files = False  # Track if any .py files are found
+def iter_python_files(repo_path, exclude=DEFAULT_EXCLUDES, max_file_size=MAX_FILE_SIZE,
+                      follow_symlinks=False, skipped=None, extensions=SOURCE_EXTENSIONS):
+    """
+    Lazily yield the .py files and notebooks of a repository in a deterministic order.
 
-    for root, dirs, files in os.walk(repo_path):
-        for file in files:
-            if file.endswith(".py"):
-                found_files = True
-                file_path = os.path.join(root, file)
-                tree = generate_ast_for_file(file_path)
-                trees.append(tree)  # Store each file's AST
+    Directories and files matching the exclude globs are pruned, .py files larger than
+    max_file_size are skipped (notebook size is dominated by outputs, which are never
+    loaded), and every directory is visited at most once (by device
+    and inode) so symlink loops cannot recurse forever. Skipped files are recorded
+    in the optional skipped dict as file_path -> reason.
+    """
+    visited = set()
+    stack = [repo_path]
+    while stack:
+        directory = stack.pop()
+        try:
+            stat = os.stat(directory)
+            entries = sorted(os.scandir(directory), key=lambda entry: entry.name)
+        except OSError as e:
+            print(f"Cannot read directory {directory}: {e}")
+            continue
+        if (stat.st_dev, stat.st_ino) in visited:
+            continue  # Already walked through another symlink
+        visited.add((stat.st_dev, stat.st_ino))
+
+        subdirs = []
+        for entry in entries:
+            rel_path = os.path.relpath(entry.path, repo_path).replace(os.sep, "/")
+            if is_excluded(entry.name, rel_path, exclude):
+                continue
+            try:
+                if entry.is_dir(follow_symlinks=follow_symlinks):
+                    subdirs.append(entry.path)
+                elif entry.name.endswith(extensions) and entry.is_file():
+                    size = entry.stat().st_size
+                    if max_file_size and size > max_file_size and entry.name.endswith(".py"):
+                        if skipped is not None:
+                            skipped[entry.path] = f"file larger than {max_file_size} bytes ({size})"
+                        continue
+                    yield entry.path
+            except OSError:
+                continue  # Broken symlink or file removed while walking
+        stack.extend(reversed(subdirs))  # Pop in sorted order
+
+
+def commit_file_order(path):
+    """Sort key putting the files of a directory before its subdirectories, as iter_python_files walks them."""
+    *directories, name = path.split("/")
+    return tuple((1, directory) for directory in directories) + ((0, name),)
+
+
+def iter_commit_files(repo_path, commit, exclude=DEFAULT_EXCLUDES, max_file_size=MAX_FILE_SIZE,
+                      skipped=None, extensions=SOURCE_EXTENSIONS):
+    """
+    Lazily yield (path, data) for the .py files and notebooks of a commit, read from
+    the object database of repo_path (a bare repository works) without a checkout.
+
+    Paths are relative to the repository root and go through the same exclusions,
+    size limit and order as iter_python_files. Blobs are streamed from a single
+    GitObjectReader; in a partial clone the missing ones are fetched beforehand, in
+    one request.
+    """
+    entries = []
+    for path, sha in list_tree(repo_path, commit):
+        if not path.endswith(extensions):
+            continue
+        parts = path.split("/")
+        if any(is_excluded(part, "/".join(parts[:i + 1]), exclude) for i, part in enumerate(parts)):
+            continue
+        entries.append((path, sha))
+    entries.sort(key=lambda entry: commit_file_order(entry[0]))
+    prefetch_blobs(repo_path, commit, [sha for _, sha in entries])
+
+    with GitObjectReader(repo_path) as reader:
+        for path, sha in entries:
+            max_size = max_file_size if max_file_size and path.endswith(".py") else None
+            _, data = reader.read(sha, max_size)
+            if data is None:
+                if skipped is not None:
+                    skipped[path] = f"file larger than {max_file_size} bytes"
+                continue
+            yield path, data
+
+
+# Module name fragments that can make a file relevant to at least one detector. Kept in sync
+# with cloud_patterns_ast, the sdk_imports tables, module_to_metric in Data_Drift and
+# API_limit, the schema validation libraries and the sentiment API import indicators.
+ML_IMPORT_PATTERNS = (
+    "azure", "google", "vertexai", "tensorflow", "keras", "boto3", "sagemaker", "databrew",
+    "alibi_detect", "evidently", "scipy", "sklearn", "mlflow", "dvc", "torch", "requests",
+)
+ML_IMPORT_RE = re.compile(
+    r"^[ \t]*(?:from|import)[ \t][^\n]*?(?:" + "|".join(map(re.escape, ML_IMPORT_PATTERNS)) + ")",
+    re.MULTILINE | re.IGNORECASE,
+)
+
+
+def imports_ml_module(source_code):
+    """
+    Cheap relevance check run before parsing: does any import line mention an ML SDK?
+
+    A single regex pass over the import lines; files failing it cannot produce a
+    finding in any detector, so they are never parsed.
+    """
+    return ML_IMPORT_RE.search(source_code) is not None
+
+
+def has_long_lines(source_code, max_line_length=MAX_LINE_LENGTH):
+    return bool(max_line_length) and any(len(line) > max_line_length for line in source_code.splitlines())
+
+
+# Text patterns only look at this many characters of a line, which bounds the
+# backtracking of patterns such as "a.*b.*c" on minified code
+MAX_SCAN_LINE_LENGTH = 2000
+
+
+@functools.lru_cache(maxsize=256)
+def compile_alternation(patterns, remaining, flags):
+    """Alternation of named groups p<i> for the patterns at the remaining indexes; bounded, shared by scanners."""
+    return re.compile("|".join(f"(?P<p{i}>{patterns[i]})" for i in remaining), flags)
+
+
+class LineScanner:
+    """
+    Find the first line matched by each of a set of regular expressions, in one pass.
+
+    The patterns are joined into a single alternation of named groups and run over
+    the whole source; match offsets are mapped to line numbers with a precomputed
+    line-offset index. Since an alternation reports one pattern per match, a newly
+    found pattern is dropped from the alternation and the scan resumes at the start
+    of its line, so every pattern still gets its first line. Lines are cut to
+    max_line_length characters before matching.
+    """
+
+    def __init__(self, patterns, flags=0, max_line_length=MAX_SCAN_LINE_LENGTH):
+        self.patterns = tuple(patterns)
+        self.flags = flags
+        self.max_line_length = max_line_length
+
+    def _regex(self, remaining):
+        return compile_alternation(self.patterns, remaining, self.flags)
+
+    def _capped(self, source):
+        if not self.max_line_length or not has_long_lines(source, self.max_line_length):
+            return source
+        return "\n".join(line[:self.max_line_length] for line in source.split("\n"))
+
+    def first_lines(self, source):
+        """Return {pattern: (lineno, line)} for every pattern matching some line of source."""
+        text = self._capped(source)
+        line_starts = [0] + [match.end() for match in re.finditer("\n", text)]
+        found = {}
+        remaining = tuple(range(len(self.patterns)))
+        position = 0
+        while remaining:
+            match = self._regex(remaining).search(text, position)
+            if match is None:
+                break
+            i = int(match.lastgroup[1:])
+            line_index = bisect.bisect_right(line_starts, match.start()) - 1
+            end = line_starts[line_index + 1] - 1 if line_index + 1 < len(line_starts) else len(text)
+            found[self.patterns[i]] = (line_index + 1, text[line_starts[line_index]:end])
+            remaining = tuple(j for j in remaining if j != i)
+            position = line_starts[line_index]  # Other patterns may match earlier on the same line
+        return found
+
+
+def generate_ast_for_file(file_path, cache=None):
+    tree, _ = parse_source(read_source(file_path), cache)
+    return tree  # Return
+
+
+def load_source(file_path, data=None):
+    """
+    Default source loader: the (source_code, line_map) of a file, read from data
+    (the file's bytes, e.g. a git blob) when given, otherwise from disk.
+    """
+    stream = text_stream(data) if data is not None else None
+    if file_path.endswith(".ipynb"):
+        return notebook_to_source(file_path, stream)
+    return (stream.read() if stream is not None else read_source(file_path)), None
+
+
+def parse_file(file_path, cache=None, max_line_length=MAX_LINE_LENGTH, prefilter=True, data=None, load=load_source):
+    """
+    Read and parse one file without raising.
+
+    Module-level so it can run in a worker process. Returns a
+    (file_path, source_code, tree, error, skipped_regions, line_map) tuple where
+    tree is None on failure or when the file has lines longer than max_line_length.
+    With prefilter, files that import no ML module are not parsed and come back
+    with neither a tree nor an error. Notebooks are parsed from their code cells,
+    and line_map maps each source line back to its (cell_number, line_in_cell);
+    it is None for .py files. The source comes from load(file_path, data), see
+    load_source.
+    """
+    source_code, line_map = None, None
+    try:
+        source_code, line_map = load(file_path, data)
+        if prefilter and not imports_ml_module(source_code):
+            return file_path, None, None, None, [], line_map
+        if has_long_lines(source_code, max_line_length):
+            return file_path, source_code, None, f"skipped: lines longer than {max_line_length} characters", [], line_map
+        tree, skipped_regions = parse_source(source_code, cache)
+        return file_path, source_code, tree, None, skipped_regions, line_map
+    except Exception as e:
+        return file_path, source_code, None, str(e), [], line_map
+
+
+def _parse_item(item, load, cache, max_line_length, prefilter):
+    file_path, data = item
+    return parse_file(file_path, cache, max_line_length, prefilter, data, load)
 
-    if not found_files:
-        print("No Python (.py) files found in the repository.")
+
+# Below this many files, starting worker processes costs more than it saves
+PARALLEL_MIN_FILES = 64
+
+
+def parse_sources(items, load=load_source, cache=None, workers=None, max_line_length=MAX_LINE_LENGTH, prefilter=True):
+    """
+    Parse (file_path, data) items sequentially, or with a process pool when workers > 1.
+
+    Each source is loaded with load(file_path, data), which must be module-level when
+    workers > 1. Results are yielded in the order of items either way, so the
+    outcome does not depend on the number of workers. The sequential path consumes
+    items lazily.
+    """
+    if workers and workers > 1:
+        items = list(items)
+    if not workers or workers <= 1 or len(items) < PARALLEL_MIN_FILES:
+        for item in items:
+            yield _parse_item(item, load, cache, max_line_length, prefilter)
+        return
+
+    from concurrent.futures import ProcessPoolExecutor
+    from functools import partial
+
+    chunksize = max(1, len(items) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        parse = partial(_parse_item, load=load, cache=cache, max_line_length=max_line_length, prefilter=prefilter)
+        yield from pool.map(parse, items, chunksize=chunksize)
+
+
+def parse_files(file_paths, cache=None, workers=None, max_line_length=MAX_LINE_LENGTH, prefilter=True):
+    """parse_sources for files on disk."""
+    return parse_sources(((file_path, None) for file_path in file_paths), load_source, cache, workers,
+                         max_line_length, prefilter)
+
+
+class RepoIndex:
+    """
+    Parsed view of a repository, built once and shared by every detector.
+
+    The repository is walked and parsed a single time; detectors read the file
+    list, the sources, the per-file ASTs and the combined module from the index
+    instead of re-parsing the repository on their own. An optional ASTCache lets
+    re-runs over unchanged files skip parsing altogether, and workers > 1 spreads
+    parsing over a process pool. Files are found by iter_python_files, so vendored
+    and generated code is never read, and with prefilter only files importing an
+    ML module are parsed; the others are listed in irrelevant and only count
+    toward the file list. A repository holding nothing but such files still gets
+    an (empty) combined module, so repository-wide absence checks report on it.
+
+    With a commit (any revision), the files are read from the object database of
+    repo_path instead of its working tree: the repository may be bare, nothing is
+    checked out or written, file paths are relative to the repository root and
+    commit holds the full SHA that was scanned.
+    """
+
+    def __init__(self, repo_path, cache=None, workers=None, exclude=DEFAULT_EXCLUDES,
+                 max_file_size=MAX_FILE_SIZE, max_line_length=MAX_LINE_LENGTH, prefilter=True, commit=None):
+        self.repo_path = repo_path
+        self.cache = cache
+        self.max_line_length = max_line_length
+        self.prefilter = prefilter
+        self.files = []  # Paths of every .py file found in the repository
+        self.irrelevant = []  # Files not parsed because they import no ML module
+        self.sources = {}  # file_path -> source code
+        self.trees = []  # List of (file_path, tree) tuples for the files that parsed
+        self.errors = {}  # file_path -> error message for the files that did not
+        self.skipped = {}  # file_path -> reason, for files filtered out before reading
+        self.recovered = {}  # file_path -> (first_line, last_line) regions dropped by the recovering parser
+        self.line_maps = {}  # notebook file_path -> [(cell_number, line_in_cell), ...] per source line
+        self._combined_tree = None
+        self.commit = None
+
+        if commit is None:
+            file_paths = iter_python_files(repo_path, exclude, max_file_size, skipped=self.skipped)
+            results = parse_files(file_paths, cache, workers, max_line_length, prefilter)
+        else:
+            self.commit = resolve_commit(repo_path, commit)
+            blobs = iter_commit_files(repo_path, self.commit, exclude, max_file_size, skipped=self.skipped)
+            results = parse_sources(blobs, load_source, cache, workers, max_line_length, prefilter)
+        for result in results:
+            self.add_result(*result)
+
+        if not self.files:
+            print("No Python (.py) files or notebooks found in the repository.")
+
+    def add_result(self, file_path, source_code, tree, error, skipped_regions=(), line_map=None):
+        """Record the outcome of parse_file, keeping failed files out of the trees."""
+        self.files.append(file_path)
+        if source_code is not None:
+            self.sources[file_path] = source_code
+        if line_map is not None:
+            self.line_maps[file_path] = line_map
+        if skipped_regions:
+            self.recovered[file_path] = list(skipped_regions)
+            print(f"Recovered {file_path}: skipped lines {', '.join(f'{a}-{b}' for a, b in skipped_regions)}")
+        if tree is not None:
+            self.trees.append((file_path, tree))
+        elif error is None:
+            self.irrelevant.append(file_path)
+        else:
+            self.errors[file_path] = error
+            print(f"Error processing {file_path}: {error}")
+
+    def add_file(self, file_path):
+        """Read and parse one file, recording the error instead of aborting the repository."""
+        self.add_result(*parse_file(file_path, self.cache, self.max_line_length, self.prefilter))
+
+    @property
+    def label(self):
+        """Name of what was scanned in reports: the repository path, and the commit SHA when read from git."""
+        return f"{self.repo_path}@{self.commit}" if self.commit else self.repo_path
+
+    def location(self, file_path, lineno):
+        """Describe where a line is, using the notebook cell and line within it for notebooks."""
+        line_map = self.line_maps.get(file_path)
+        if line_map and 0 < lineno <= len(line_map):
+            cell_number, line_in_cell = line_map[lineno - 1]
+            return f"line {line_in_cell} of cell {cell_number} of {file_path}"
+        return f"line {lineno} of {file_path}"
+
+    def file_of(self, node):
+        """Path of the file a node (of a per-file tree or of combined_tree) comes from, or None."""
+        for file_path, tree in self.trees:
+            if any(id(node) in table.positions for table in node_tables(tree)):
+                return file_path
         return None
 
-    combined_ast = combine_asts(trees)  # Combine all individual ASTs
-    return combined_ast  # Return the combined AST for the entire repositor
+    def node_location(self, node):
+        """location() of a node, for detectors working on combined_tree."""
+        file_path = self.file_of(node)
+        if file_path is None:
+            return f"line {node.lineno}"
+        return self.location(file_path, node.lineno)
 
+    @property
+    def combined_tree(self):
+        """
+        Single ast.Module holding the body of every parsed file, or None if nothing
+        parsed; files skipped by the prefilter count as parsed, with an empty body.
+        """
+        if self._combined_tree is None and (self.trees or self.irrelevant):
+            self._combined_tree = combine_asts([tree for _, tree in self.trees])
+            # Reuse the per-file import and node tables instead of walking the combined module again
+            IMPORT_TABLES[self._combined_tree] = ImportTable.merge([import_table(tree) for _, tree in self.trees])
+            register_combined_tree(self._combined_tree, [tree for _, tree in self.trees])
+        return self._combined_tree
 
+    @property
+    def imports(self):
+        """Repository-level ImportTable."""
+        if self.combined_tree is None:
+            return ImportTable([])
+        return import_table(self.combined_tree)
+
+
+def load_repo_index(repo, cache=None, workers=None):
+    """Accept either a repository path or an already built RepoIndex."""
+    if isinstance(repo, RepoIndex):
+        return repo
+    return RepoIndex(repo, cache, workers)
+
+
+# Generate ASTs for the entire repository, excluding vendored and generated code
+def generate_asts_for_repo(repo_path, workers=None):
+    return load_repo_index(repo_path, workers=workers).trees  # Return the list of (file_path, tree) tuples
+
+
+def generate_ast_for_repo(repo_path, workers=None):
+    return load_repo_index(repo_path, workers=workers).combined_tree  # Return the combined AST for the entire repository
+
+
+
+# Give up on a file after this many recovery rounds (one parse each)
+RECOVERY_MAX_ATTEMPTS = 100
+
+# Lines starting with these keywords continue the compound statement above them
+CONTINUATION_KEYWORDS = {"else", "elif", "except", "finally"}
+
+
+def string_continuation_lines(lines):
+    """
+    Return the 0-based indexes of the lines that begin inside a multi-line string
+    literal (docstrings, SQL, prompt templates), as far as the tokenizer gets
+    through the source before an error stops it.
+    """
+    inside = set()
+    fstring_starts = []  # Python 3.12+ tokenizes f-strings in pieces
+    readline = iter(line + "\n" for line in lines).__next__
+    try:
+        for token in tokenize.generate_tokens(readline):
+            if token.type == tokenize.STRING:
+                first = token.start[0]
+            elif token.type == getattr(tokenize, "FSTRING_START", None):
+                fstring_starts.append(token.start[0])
+                continue
+            elif token.type == getattr(tokenize, "FSTRING_END", None):
+                first = fstring_starts.pop()
+            else:
+                continue
+            inside.update(range(first, token.end[0]))  # Rows are 1-based: rows first+1..end, as indexes
+    except (tokenize.TokenError, SyntaxError, IndexError):
+        pass  # Lines past the error are left to the line-based rules
+    return inside
+
+
+def top_level_statement_starts(lines):
+    """
+    Return the 0-based indexes of the lines where a top-level statement may begin.
+
+    Lines inside multi-line strings are found with the tokenizer first. The rest is
+    a line-based segmentation, so it also works on code that the tokenizer rejects:
+    a statement starts on an unindented line that is not a comment, does not
+    close a bracket, does not continue the previous line or a decorator, and does
+    not open an else/elif/except/finally clause.
+    """
+    starts = [0]
+    previous = ""  # Last non-blank, non-comment line
+    in_string = string_continuation_lines(lines)
+    for i, line in enumerate(lines):
+        stripped = line.strip()
+        if i in in_string:
+            previous = line.rstrip()
+            continue
+        if not stripped or stripped.startswith("#"):
+            continue
+        if (i > 0 and not line[0].isspace() and line[0] not in ")]}"
+                and not previous.endswith("\\") and not previous.startswith("@")
+                and re.split(r"[\s:(]", stripped, 1)[0] not in CONTINUATION_KEYWORDS):
+            starts.append(i)
+        previous = line.rstrip()
+    return starts
+
+
+def parse_with_recovery(source_code):
+    """
+    Parse source code, dropping only the top-level statements that fail to parse.
+
+    A valid file costs one ast.parse. Otherwise the SyntaxError line number points
+    at the failing top-level statement, which is blanked out (keeping every other
+    line number intact) before parsing again, so a file costs one parse per broken
+    statement rather than one per line. Returns (tree, skipped_regions), the
+    regions being 1-based inclusive (first_line, last_line) ranges.
+    """
+    try:
+        return ast.parse(source_code), []
+    except SyntaxError as e:
+        error = e
 
-def preprocess_code(source_code):
-    """Preprocess the code to skip lines that cause parsing issues."""
     lines = source_code.splitlines()
-    cleaned_lines = []
-    for line in lines:
+    starts = top_level_statement_starts(lines)
+    skipped = set()
+    for _ in range(RECOVERY_MAX_ATTEMPTS):
+        if not error.lineno or not lines:
+            raise error
+        index = bisect.bisect_right(starts, min(error.lineno, len(lines)) - 1) - 1
+        start = starts[index]
+        end = starts[index + 1] if index + 1 < len(starts) else len(lines)
+        if (start + 1, end) in skipped:
+            raise error  # The error is not inside a statement we can drop
+        skipped.add((start + 1, end))
+        lines[start:end] = [""] * (end - start)
         try:
-            ast.parse(line)  # Try parsing the line
-            cleaned_lines.append(line)  # If successful, keep the line
-        except (SyntaxError, IndentationError):
-            print(f"Skipping problematic line: {line.strip()}")
-            cleaned_lines.append("# Skipped problematic line")  # Replace with a placeholder comment
-    return "\n".join(cleaned_lines)
+            return ast.parse("\n".join(lines)), sorted(skipped)
+        except SyntaxError as e:
+            error = e
+    raise error
+
+
+def preprocess_code(source_code):
+    """Preprocess the code to skip the top-level statements that cause parsing issues."""
+    lines = source_code.splitlines()
+    try:
+        _, skipped_regions = parse_with_recovery(source_code)
+    except (SyntaxError, ValueError):
+        skipped_regions = [(1, len(lines))]
+    for first_line, last_line in skipped_regions:
+        for i in range(first_line - 1, last_line):
+            if lines[i].strip():
+                print(f"Skipping problematic line: {lines[i].strip()}")
+                lines[i] = "# Skipped problematic line"  # Replace with a placeholder comment
+    return "\n".join(lines)
 
 
 
 def combine_asts(trees):
     # Combine all individual ASTs into one root node
-    combined_ast = ast.Module(body=[])
+    combined_ast = ast.Module(body=[], type_ignores=[])
     for tree in trees:
         if tree is not None:  # Only add valid ASTs
             combined_ast.body.extend(tree.body)
     return combined_ast
 
 
+# One import statement: module is None for "import a, b" (the aliases are the modules),
+# aliases is a list of (name, asname) pairs and is_from tells "from m import x" apart.
+ImportRecord = namedtuple("ImportRecord", "module aliases lineno is_from")
+
+# Fields holding nested statements; imports are statements, so expressions are never visited
+STATEMENT_FIELDS = ("body", "orelse", "finalbody", "handlers", "cases")
+
+
+class ImportTable:
+    """
+    Imports of a file (or of a whole repository, see merge), collected in one pass.
+
+    Records are kept in source order. The table indexes them by imported module, by
+    every dotted prefix of those modules and by the local names they bind, so import
+    questions become lookups instead of walks over the whole tree.
+    """
+
+    def __init__(self, records):
+        self.records = records
+        self.modules = set()  # "import a.b" -> a.b, "from m import x" -> m
+        self.by_module = {}  # module -> [records]
+        self.by_prefix = {}  # every dotted prefix of a module -> {modules}
+        self.aliases = {}  # local name -> qualified name it is bound to
+        self.provider = None  # Memoized by detect_cloud_provider
+        self._contains = {}  # fragment -> bool, memoized substring lookups
+
+        for record in records:
+            if record.is_from:
+                modules = [record.module] if record.module else []
+                for name, asname in record.aliases:
+                    qualified = f"{record.module}.{name}" if record.module else name
+                    self.aliases[asname or name] = qualified
+            else:
+                modules = [name for name, _ in record.aliases]
+                for name, asname in record.aliases:
+                    if asname:
+                        self.aliases[asname] = name
+                    else:
+                        head = name.split(".", 1)[0]
+                        self.aliases[head] = head  # "import a.b" binds "a"
+            for module in modules:
+                self.modules.add(module)
+                self.by_module.setdefault(module, []).append(record)
+                parts = module.split(".")
+                for i in range(1, len(parts) + 1):
+                    self.by_prefix.setdefault(".".join(parts[:i]), set()).add(module)
+
+    @classmethod
+    def from_tree(cls, tree):
+        """Collect the import statements of a tree, visiting statements only, in source order."""
+        records = []
+        stack = [tree]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, ast.Import):
+                records.append(ImportRecord(None, [(a.name, a.asname) for a in node.names], node.lineno, False))
+            elif isinstance(node, ast.ImportFrom):
+                records.append(ImportRecord(node.module, [(a.name, a.asname) for a in node.names], node.lineno, True))
+            children = []
+            for field in STATEMENT_FIELDS:
+                children.extend(getattr(node, field, None) or ())
+            stack.extend(reversed(children))
+        return cls(records)
+
+    @classmethod
+    def merge(cls, tables):
+        """Repository-level table: the records of every file, in file order."""
+        return cls([record for table in tables for record in table.records])
+
+    def has_prefix(self, prefix):
+        """True if a module equal to prefix, or below it (prefix.x), is imported."""
+        return prefix in self.by_prefix
+
+    def module_contains(self, fragment):
+        """True if fragment is a substring of any imported module name."""
+        if fragment not in self._contains:
+            self._contains[fragment] = any(fragment in module for module in self.modules)
+        return self._contains[fragment]
+
+    def matches(self, pattern):
+        """
+        Match an import pattern: either a module fragment (substring of an imported
+        module or name) or a "from module import Name" statement.
+        """
+        if pattern.startswith("from "):
+            module, _, name = pattern[5:].partition(" import ")
+            return any(name in [alias for alias, _ in record.aliases]
+                       for record in self.by_module.get(module, ()) if record.is_from)
+        if self.module_contains(pattern):
+            return True
+        return any(pattern in name for record in self.records if record.is_from for name, _ in record.aliases)
+
+
+# Tables are memoized per tree; weak keys let them go away with the tree
+IMPORT_TABLES = weakref.WeakKeyDictionary()
+
+
+def import_table(tree):
+    """Return the (memoized) ImportTable of a tree."""
+    table = IMPORT_TABLES.get(tree)
+    if table is None:
+        table = IMPORT_TABLES[tree] = ImportTable.from_tree(tree)
+    return table
+
+
+class NameResolver:
+    """
+    Canonical dotted names of call targets and other Name/Attribute chains.
+
+    The head of a chain is mapped through the file's import aliases, so with
+    "import torch as T" the target of T.save(...) is "torch.save", and with
+    "from tensorflow.keras.callbacks import ModelCheckpoint as MC" the target of
+    MC(...) is "tensorflow.keras.callbacks.ModelCheckpoint". Results are memoized
+    per node id, including those of the inner links of a chain. Without a tree,
+    names are returned as written. Aliases are those of the tree's import table,
+    so build resolvers per file: on a combined repository module they would be
+    the merged aliases of every file.
+    """
+
+    def __init__(self, tree=None):
+        self.aliases = import_table(tree).aliases if tree is not None else {}
+        self._names = {}  # id(node) -> qualified name
+
+    def qualified_name(self, node):
+        """
+        Dotted name of a Name or Attribute chain; "" for other expressions. When the
+        chain starts from an expression (f().save), only the attribute part is kept.
+        """
+        name = self._names.get(id(node))
+        if name is not None:
+            return name
+        chain = []
+        while isinstance(node, ast.Attribute) and id(node) not in self._names:
+            chain.append(node)
+            node = node.value
+        if id(node) in self._names:
+            name = self._names[id(node)]
+        elif isinstance(node, ast.Name):
+            name = self._names[id(node)] = self.aliases.get(node.id, node.id)
+        else:
+            name = ""
+        for link in reversed(chain):
+            name = self._names[id(link)] = f"{name}.{link.attr}" if name else link.attr
+        return name
+
+    def call_name(self, node):
+        """Qualified name of the function called by an ast.Call."""
+        return self.qualified_name(node.func)
+
+
+# Resolvers are memoized per tree, like the import tables
+NAME_RESOLVERS = weakref.WeakKeyDictionary()
+
+
+def name_resolver(tree):
+    """Return the (memoized) NameResolver of a tree."""
+    resolver = NAME_RESOLVERS.get(tree)
+    if resolver is None:
+        resolver = NAME_RESOLVERS[tree] = NameResolver(tree)
+    return resolver
+
+
+class SymbolIndex(Rule):
+    """
+    Occurrences of identifiers in a tree, collected in one engine pass.
+
+    names maps an identifier to its Name nodes, attributes maps (name, attr) to the
+    Attribute nodes of the form name.attr, and calls_on maps a name to the calls made
+    through it (name.f(...) or name.f[...](...)). Metric-usage questions from the
+    detectors are then dictionary lookups, whatever the size of their catalogs.
+    """
+
+    def __init__(self):
+        self.names = {}  # identifier -> [ast.Name]
+        self.attributes = {}  # (identifier, attr) -> [ast.Attribute]
+        self.calls_on = {}  # identifier -> [ast.Call]
+        self._sorted_names = None
+        self._prefixes = {}  # prefix -> bool, memoized prefix lookups
+
+    def visit_Name(self, node):
+        self.names.setdefault(node.id, []).append(node)
+
+    def visit_Attribute(self, node):
+        if isinstance(node.value, ast.Name):
+            self.attributes.setdefault((node.value.id, node.attr), []).append(node)
+
+    def visit_Call(self, node):
+        if isinstance(node.func, (ast.Attribute, ast.Subscript)) and isinstance(node.func.value, ast.Name):
+            self.calls_on.setdefault(node.func.value.id, []).append(node)
+
+    def uses_name(self, name):
+        return name in self.names
+
+    def uses_attribute(self, name, attr):
+        return (name, attr) in self.attributes
+
+    def uses_name_prefix(self, prefix):
+        """True if any identifier starts with prefix."""
+        if prefix not in self._prefixes:
+            if self._sorted_names is None:
+                self._sorted_names = sorted(self.names)
+            i = bisect.bisect_left(self._sorted_names, prefix)
+            self._prefixes[prefix] = i < len(self._sorted_names) and self._sorted_names[i].startswith(prefix)
+        return self._prefixes[prefix]
+
+
+# Indexes are memoized per tree, like the import tables
+SYMBOL_INDEXES = weakref.WeakKeyDictionary()
+
+
+def symbol_index(tree):
+    """Return the (memoized) SymbolIndex of a tree."""
+    index = SYMBOL_INDEXES.get(tree)
+    if index is None:
+        index = SYMBOL_INDEXES[tree] = SymbolIndex()
+        index.visit(tree)
+    return index
+
+
+class AssignmentIndex(Rule):
+    """
+    Values bound to plain names, per scope, with simple constant propagation.
+
+    A scope is a (module, function) pair: the module of the file the code is in
+    (one of the files of a combined tree) and the nearest enclosing function, None
+    at module level, so files never see each other's bindings. The index
+    keeps the last `name = value` of each scope plus the later `name[key] = value`
+    and `name.update(...)` calls, and folds them on demand into Python strings and
+    dicts: string literals, f-strings and `+` concatenation, dict displays, `**`
+    merges, `|` and dict(...). resolve() is memoized, so each call site costs a
+    lookup rather than a walk of the tree.
+    """
+
+    def __init__(self, tree):
+        self.parents = ParentIndex(tree)
+        self.assignments = {}  # (scope, name) -> value node of the last assignment
+        self.updates = {}  # (scope, name) -> [(key node, keyword name, or None for a merge; value node)]
+        self._resolved = {}
+        self.visit(tree)
+
+    def _bind(self, target, value):
+        scope = (self.parents.module(target), self.context.function)
+        if isinstance(target, ast.Name):
+            self.assignments[(scope, target.id)] = value
+            self.updates.pop((scope, target.id), None)
+        elif isinstance(target, ast.Subscript) and isinstance(target.value, ast.Name):
+            self.updates.setdefault((scope, target.value.id), []).append((target.slice, value))
+
+    def visit_Assign(self, node):
+        for target in node.targets:
+            self._bind(target, node.value)
+
+    def visit_AnnAssign(self, node):
+        if node.value is not None:
+            self._bind(node.target, node.value)
+
+    def visit_Call(self, node):
+        func = node.func
+        if (isinstance(func, ast.Attribute) and func.attr == "update" and isinstance(func.value, ast.Name)
+                and (node.args or node.keywords)):
+            scope = (self.parents.module(node), self.context.function)
+            updates = self.updates.setdefault((scope, func.value.id), [])
+            if node.args:
+                updates.append((None, node.args[0]))
+            # d.update(limit=1) sets a key, d.update(**other) merges like a positional dict
+            updates.extend((keyword.arg, keyword.value) for keyword in node.keywords)
+
+    def scope_of(self, node):
+        return self.parents.module(node), self.parents.enclosing_function(node)
+
+    def resolve(self, name, scope=None):
+        """Folded value of a name as seen from scope, falling back to its module level; None if unknown."""
+        key = (scope, name)
+        if key not in self.assignments and key not in self.updates:
+            key = ((scope[0] if scope else None, None), name)
+        if key in self._resolved:
+            return self._resolved[key]
+        self._resolved[key] = None  # Guards against self-referencing assignments
+        value = self.value(self.assignments.get(key), key[0])
+        for item_key, item_value in self.updates.get(key, ()):
+            if value is None:
+                value = {}
+            if not isinstance(value, dict):
+                break
+            if item_key is None:
+                update = self.value(item_value, key[0])
+                if isinstance(update, dict):
+                    value = {**value, **update}
+            else:
+                folded_key = item_key if isinstance(item_key, str) else self.value(item_key, key[0])
+                if isinstance(folded_key, str):
+                    value = {**value, folded_key: self.value(item_value, key[0])}
+        self._resolved[key] = value
+        return value
+
+    def value(self, node, scope=None):
+        """Fold an expression into a str, dict or other constant; None if it cannot be resolved."""
+        if isinstance(node, ast.Constant):
+            return node.value
+        if isinstance(node, ast.Name):
+            return self.resolve(node.id, scope)
+        if isinstance(node, ast.JoinedStr):
+            parts = []
+            for part in node.values:
+                folded = self.value(part.value if isinstance(part, ast.FormattedValue) else part, scope)
+                parts.append(folded if isinstance(folded, str) else "")
+            return "".join(parts)
+        if isinstance(node, ast.BinOp):
+            left, right = self.value(node.left, scope), self.value(node.right, scope)
+            if isinstance(node.op, ast.Add) and isinstance(left, str) and isinstance(right, str):
+                return left + right
+            if isinstance(node.op, ast.BitOr) and isinstance(left, dict) and isinstance(right, dict):
+                return {**left, **right}
+            return None
+        if isinstance(node, ast.Dict):
+            folded = {}
+            for key, item in zip(node.keys, node.values):
+                if key is None:  # **other
+                    other = self.value(item, scope)
+                    if isinstance(other, dict):
+                        folded.update(other)
+                else:
+                    folded_key = self.value(key, scope)
+                    if isinstance(folded_key, str):
+                        folded[folded_key] = self.value(item, scope)
+            return folded
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id == "dict":
+            folded = self.value(node.args[0], scope) if node.args else {}
+            if not isinstance(folded, dict):
+                return None
+            return {**folded, **{kw.arg: self.value(kw.value, scope) for kw in node.keywords if kw.arg}}
+        return None
+
+    def value_at(self, node):
+        """Fold an expression using the bindings of the scope it appears in."""
+        return self.value(node, self.scope_of(node))
+
+
+# Memoized per tree, like SYMBOL_INDEXES
+ASSIGNMENT_INDEXES = weakref.WeakKeyDictionary()
+
+
+def assignment_index(tree):
+    """Return the (memoized) AssignmentIndex of a tree."""
+    index = ASSIGNMENT_INDEXES.get(tree)
+    if index is None:
+        index = ASSIGNMENT_INDEXES[tree] = AssignmentIndex(tree)
+    return index
+
+
 # Define cloud provider patterns (matches names or modules in the AST)
 cloud_patterns_ast = {
     "Azure": ["azure", "azureml"],
@@ -90,19 +921,15 @@ cloud_patterns_ast = {
 }
 
 def detect_cloud_provider(tree):
-    provider_counts = {provider: 0 for provider in cloud_patterns_ast}
-    for node in ast.walk(tree):
-        # Check for imports and match them against the patterns
-        if isinstance(node, ast.Import):
-            for alias in node.names:
+    imports = import_table(tree)
+    if imports.provider is None:
+        provider_counts = {provider: 0 for provider in cloud_patterns_ast}
+        for record in imports.records:
+            # "import a, b" counts every module, "from m import x" counts m once
+            modules = [record.module] if record.is_from else [name for name, _ in record.aliases]
+            for module in modules:
                 for provider, patterns in cloud_patterns_ast.items():
-                    if any(pattern in alias.name for pattern in patterns):
+                    if module and any(pattern in module for pattern in patterns):
                         provider_counts[provider] += 1
-        elif isinstance(node, ast.ImportFrom):
-            for provider, patterns in cloud_patterns_ast.items():
-                if node.module and any(pattern in node.module for pattern in patterns):
-                    provider_counts[provider] += 1
-    return max(provider_counts, key=provider_counts.get) if any(provider_counts.values()) else "Unknown"
-
-
-
+        imports.provider = max(provider_counts, key=provider_counts.get) if any(provider_counts.values()) else "Unknown"
+    return imports.provider
@@ -3,43 +3,17 @@ from detection.common import *
 from detection.output import *
 
 
-class ImportChecker(ast.NodeVisitor):
-    def __init__(self):
-        self.imports = set()
-
-    def visit_Import(self, node):
-        # Capture 'import module_name' statements
-        for alias in node.names:
-            self.imports.add(alias.name)
-        self.generic_visit(node)
-
-    def visit_ImportFrom(self, node):
-        # Capture 'from module import submodule' statements
-        module = node.module
-        if module:
-            self.imports.add(module)
-        self.generic_visit(node)
-
-# Step 2: Create a class to check if the imported monitoring library is used in the code
-class ImportUsageChecker(ast.NodeVisitor):
-    def __init__(self, import_name, metric_name):
-        self.import_name = import_name
-        self.metric_name = metric_name
-        self.is_used = False
-
-    def visit_Attribute(self, node):
-        # Check if the metric is used as an attribute of the module
-        if isinstance(node.value, ast.Name) and node.value.id == self.import_name and node.attr == self.metric_name:
-            print(f"Usage detected: {self.import_name}.{self.metric_name}")
-            self.is_used = True
-        self.generic_visit(node)
-
-    def visit_Name(self, node):
-        # For cases where the metric is used directly without being an attribute
-        if node.id == self.metric_name:
-            print(f"Usage detected: {self.metric_name}")
-            self.is_used = True
-        self.generic_visit(node)
+# Step 2: Check if the imported monitoring library is used in the code
+def is_metric_used(symbols, import_name, metric_name):
+    # Metric used as an attribute of the module
+    if symbols.uses_attribute(import_name, metric_name):
+        print(f"Usage detected: {import_name}.{metric_name}")
+        return True
+    # For cases where the metric is used directly without being an attribute
+    if symbols.uses_name(metric_name):
+        print(f"Usage detected: {metric_name}")
+        return True
+    return False
 
 
 def check_data_drift(tree):
@@ -59,10 +33,9 @@ def check_data_drift(tree):
     }
 
 
-    # Step 1: Extract imported modules using ImportChecker
-    checker = ImportChecker()
-    checker.visit(tree)
-    imported_modules = checker.imports
+    # Step 1: Look up imported modules in the shared import table
+    imported_modules = import_table(tree).modules
+    symbols = symbol_index(tree)
     print("Imported modules:", imported_modules)
 
     at_least_one_used = False
@@ -72,10 +45,7 @@ def check_data_drift(tree):
         if module in imported_modules:
             print(f"Module '{module}' is imported. Now checking for usage of its metric(s)...")
             for metric in metrics:
-                usage_checker = ImportUsageChecker(import_name=module, metric_name=metric)
-                usage_checker.visit(tree)
-
-                if usage_checker.is_used:
+                if is_metric_used(symbols, module, metric):
                     print(f"No Misuse: '{metric}' is used in the code.")
                     at_least_one_used = True
                 else:
@@ -90,9 +60,9 @@ def check_data_drift(tree):
         print(f"Misuse detected: None of the required modules or metrics are used. There is {misuse_count} Data_Drift misuse.")
     return misuse_count    
 
-def detect_data_drift(tree):
-    misuse_count = check_data_drift(tree)
+def detect_data_drift(index):
+    misuse_count = check_data_drift(index.combined_tree)
     return {"misuse_count_of_Data_Drift": misuse_count}
 
-def detect(repo_path):
-    return process_repos([repo_path], detect_data_drift)
+def detect(repo):
+    return process_repos([repo], detect_data_drift)
@@ -2,6 +2,111 @@
 from detection.common import *
 from detection.output import *
 
+# Early stopping policies per provider. A call matches a policy when its callee
+# (f(...) or x.f(...)) is named `call`, its receiver is `receiver` (if given), every
+# `required` keyword is passed with a value of the given kind and every `values`
+# keyword has that constant value. The policy then gives the verdict for the call.
+EARLY_STOPPING_POLICIES = {
+    "Azure": [
+        {"call": "BanditPolicy", "valid": False, "details": "Valid policy imported but not used correctly."},
+        {"call": "MedianStoppingPolicy", "valid": False, "details": "Valid policy imported but not used correctly."},
+        {"call": "TruncationSelectionPolicy", "valid": False, "details": "Valid policy imported but not used correctly."},
+        {
+            "call": "set_limits", "receiver": "sweep_job",
+            "required": {"max_total_trials": "any", "max_concurrent_trials": "any", "timeout": "any"},
+            "valid": True, "details": "Valid use of sweep_job.set_limits.",
+        },
+    ],
+    "AWS": [
+        {
+            "call": "HyperparameterTuner", "values": {"early_stopping_type": "Auto"},
+            "valid": True, "early_stopping_auto": True,
+            "details": "Valid use of HyperparameterTuner with early_stopping_type='Auto'.",
+        },
+    ],
+    "Google": [
+        {
+            "call": "EarlyStopping",
+            "required": {"monitor": "str", "patience": "constant", "restore_best_weights": "constant"},
+            "valid": True,
+            "details": "Valid configuration of EarlyStopping with monitor, patience, and restore_best_weights.",
+        },
+    ],
+}
+
+Verdict = namedtuple("Verdict", "used valid early_stopping_auto details")
+
+
+class PolicyMatcher:
+    """One compiled early stopping policy."""
+
+    KINDS = {
+        "any": lambda value: True,
+        "constant": lambda value: isinstance(value, ast.Constant),
+        "str": lambda value: isinstance(value, ast.Constant) and isinstance(value.value, str),
+    }
+
+    def __init__(self, policy):
+        self.receiver = policy.get("receiver")
+        self.required = [(name, self.KINDS[kind]) for name, kind in policy.get("required", {}).items()]
+        self.values = policy.get("values", {})
+        self.verdict = Verdict(True, policy["valid"], policy.get("early_stopping_auto", False), policy["details"])
+
+    def match(self, node):
+        if self.receiver is not None:
+            if not (isinstance(node.func, ast.Attribute) and isinstance(node.func.value, ast.Name)
+                    and node.func.value.id == self.receiver):
+                return None
+        keywords = {keyword.arg: keyword.value for keyword in node.keywords if keyword.arg}
+        for name, kind in self.required:
+            if name not in keywords or not kind(keywords[name]):
+                return None
+        for name, expected in self.values.items():
+            value = keywords.get(name)
+            if not (isinstance(value, ast.Constant) and value.value == expected):
+                return None
+        return self.verdict
+
+
+def compile_policies(policies):
+    """Index the policies as provider -> callee name -> [PolicyMatcher]."""
+    matchers = {}
+    for provider, provider_policies in policies.items():
+        for policy in provider_policies:
+            matchers.setdefault(provider, {}).setdefault(policy["call"], []).append(PolicyMatcher(policy))
+    return matchers
+
+
+# Compiled once when the module is loaded
+POLICY_MATCHERS = compile_policies(EARLY_STOPPING_POLICIES)
+
+
+class EarlyStoppingUsage(Rule):
+    """
+    Finds the early stopping verdict of a tree in one pass over its calls.
+
+    Stops at the first valid use. A use that is not valid (e.g. a policy created but
+    not configured) is kept as the verdict unless a valid one is found later.
+    """
+
+    def __init__(self, provider):
+        self.matchers = POLICY_MATCHERS.get(provider, {})
+        self.verdict = Verdict(False, False, False, f"{provider} early stopping not used.")
+
+    def visit_Call(self, node):
+        func = node.func
+        name = func.id if isinstance(func, ast.Name) else func.attr if isinstance(func, ast.Attribute) else None
+        for matcher in self.matchers.get(name, ()):
+            verdict = matcher.match(node)
+            if verdict is None:
+                continue
+            if verdict.valid:
+                self.verdict = verdict
+                return STOP  # Definite: nothing later can change the result
+            if not self.verdict.used:
+                self.verdict = verdict
+
+
 class EarlyStoppingAnalyzer:
     def __init__(self, tree, detect_cloud_provider):
         """
@@ -14,6 +119,7 @@ class EarlyStoppingAnalyzer:
         self.tree = tree
         self.detect_cloud_provider = detect_cloud_provider
         self.provider = self.detect_cloud_provider(tree)
+        self.imports = import_table(tree)  # Shared import table, built once per tree
         self.cloud_provider_info = {
             "Azure": {
                 "import_patterns": [
@@ -22,19 +128,16 @@ class EarlyStoppingAnalyzer:
                     "from azure.ai.ml.sweep import MedianStoppingPolicy",
                     "from azure.ai.ml.sweep import TruncationSelectionPolicy",
                 ],
-                "target_policies": ["BanditPolicy", "MedianStoppingPolicy", "TruncationSelectionPolicy"],
             },
             "AWS": {
                 "import_patterns": [
                     "from sagemaker.tuner import HyperparameterTuner"
                 ],
-                "target_policies": ["HyperparameterTuner"],
             },
             "Google": {
                 "import_patterns": [
                     "from tensorflow.keras.callbacks import EarlyStopping"
                 ],
-                "target_policies": ["EarlyStopping"],
             },
         }
 
@@ -84,18 +187,7 @@ class EarlyStoppingAnalyzer:
             bool: True if the SDK is used, otherwise False.
         """
         sdk_patterns = self.sdk_imports.get(self.provider.lower(), [])
-        for node in ast.walk(self.tree):
-            if isinstance(node, ast.Import):
-                for alias in node.names:
-                    for pattern in sdk_patterns:
-                        if pattern in alias.name:
-                            return True
-            elif isinstance(node, ast.ImportFrom):
-                if node.module:
-                    for pattern in sdk_patterns:
-                        if pattern in f"from {node.module} import {', '.join([alias.name for alias in node.names])}":
-                            return True
-        return False
+        return any(self.imports.matches(pattern) for pattern in sdk_patterns)
 
     def _check_imports(self):
         """
@@ -105,124 +197,29 @@ class EarlyStoppingAnalyzer:
             bool: True if the functionality is imported, otherwise False.
         """
         provider_info = self.cloud_provider_info[self.provider]
-        for node in ast.walk(self.tree):
-            if isinstance(node, ast.Import):
-                for alias in node.names:
-                    for pattern in provider_info["import_patterns"]:
-                        if pattern in alias.name:
-                            return True
-            elif isinstance(node, ast.ImportFrom):
-                if node.module:
-                    for pattern in provider_info["import_patterns"]:
-                        if pattern in f"from {node.module} import {', '.join([alias.name for alias in node.names])}":
-                            return True
-        return False
+        return any(self.imports.matches(pattern) for pattern in provider_info["import_patterns"])
 
     def _check_usage(self):
         """
-        Dynamically checks early stopping usage based on the provider.
+        Checks early stopping usage with the provider's compiled policies.
 
         Returns:
             tuple: A tuple containing validity, details, usage flag, and early stopping auto flag.
         """
-        provider_info = self.cloud_provider_info[self.provider]
-        used, early_stopping_auto, valid = False, False, False
-        details = "The best practices for early stopping are not followed."
-
-        for node in ast.walk(self.tree):
-            if self.provider == "Azure":
-                used, valid, details = self._check_azure_usage(node, provider_info)
-            elif self.provider == "AWS":
-                used, early_stopping_auto, valid, details = self._check_aws_usage(node)
-            elif self.provider == "Google":
-                used, valid, details = self._check_google_usage(node)
-
-            if used:
-                break  # If usage is found, stop checking further
-
-        return valid, details, used, early_stopping_auto
-
-    def _check_azure_usage(self, node, provider_info):
-        """
-        Check Azure-specific early stopping usage.
+        usage = EarlyStoppingUsage(self.provider)
+        usage.visit(self.tree)
+        verdict = usage.verdict
+        return verdict.valid, verdict.details, verdict.used, verdict.early_stopping_auto
 
-        Args:
-            node (ast.AST): AST node to analyze.
-            provider_info (dict): Azure provider information.
 
-        Returns:
-            tuple: A tuple containing usage, validity, and details for Azure.
-        """
-        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name):
-            if node.func.id in provider_info["target_policies"]:
-                return True, False, "Valid policy imported but not used correctly."
-        if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute):
-            if node.func.attr == "set_limits" and isinstance(node.func.value, ast.Name):
-                if node.func.value.id == "sweep_job":
-                    max_total_trials = max_concurrent_trials = timeout = None
-                    for keyword in node.keywords:
-                        if keyword.arg == "max_total_trials":
-                            max_total_trials = keyword.value
-                        elif keyword.arg == "max_concurrent_trials":
-                            max_concurrent_trials = keyword.value
-                        elif keyword.arg == "timeout":
-                            timeout = keyword.value
-                    if all(arg is not None for arg in [max_total_trials, max_concurrent_trials, timeout]):
-                        return True, True, "Valid use of sweep_job.set_limits."
-        return False, False, "Azure early stopping not used."
-
-    def _check_aws_usage(self, node):
-        """
-        Check AWS-specific early stopping usage.
-
-        Args:
-            node (ast.AST): AST node to analyze.
-
-        Returns:
-            tuple: A tuple containing usage, early stopping flag, validity, and details for AWS.
-        """
-        if isinstance(node, ast.Call):
-            func_name = node.func.id if isinstance(node.func, ast.Name) else node.func.attr
-            if func_name == "HyperparameterTuner":
-                for keyword in node.keywords:
-                    if keyword.arg == "early_stopping_type" and isinstance(keyword.value, ast.Str):
-                        if keyword.value.s == "Auto":
-                            return True, True, True, "Valid use of HyperparameterTuner with early_stopping_type='Auto'."
-        return False, False, False, "AWS early stopping not used."
-
-    def _check_google_usage(self, node):
-        """
-        Check Google-specific early stopping usage.
-
-        Args:
-            node (ast.AST): AST node to analyze.
-
-        Returns:
-            tuple: A tuple containing usage, validity, and details for Google.
-        """
-        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name):
-            if node.func.id == "EarlyStopping":
-                monitor_set = patience_set = restore_set = None
-                for keyword in node.keywords:
-                    if keyword.arg == "monitor" and isinstance(keyword.value, ast.Str):
-                        monitor_set = keyword.value.s
-                    if keyword.arg == "patience" and isinstance(keyword.value, ast.Constant):
-                        patience_set = keyword.value.value
-                    if keyword.arg == "restore_best_weights" and isinstance(keyword.value, ast.Constant):
-                        restore_set = keyword.value.value
-                if all(arg is not None for arg in [monitor_set, patience_set, restore_set]):
-                    return True, True, "Valid configuration of EarlyStopping with monitor, patience, and restore_best_weights."
-        return False, False, "Google early stopping not used."
-
-
-def detect_early_stopping(tree):
-    analyzer = EarlyStoppingAnalyzer(tree, detect_cloud_provider)
+def detect_early_stopping(index):
+    analyzer = EarlyStoppingAnalyzer(index.combined_tree, detect_cloud_provider)
     result = analyzer.analyze()
     misuse_count = 0
     if not (result.get("imported") and result.get("used") and result.get("valid")):
         misuse_count += 1
-        return {"misuse_count_of_Early_Stopping": misuse_count, "analysis_result": result}
+    return {"misuse_count_of_Early_Stopping": misuse_count, "analysis_result": result}
 
 
-def detect(repo_path):
-    return process_repos([repo_path], detect_early_stopping)
+def detect(repo):
+    return process_repos([repo], detect_early_stopping)
@@ -2,86 +2,63 @@ from detection.common import *
 from detection.output import *
 
 # Generate a combined AST for the entire repository
-def generate_combined_ast_for_repo(repo_path):
-    """Generate a combined AST for the entire repository."""
-    combined_body = []  # Collect all AST nodes
-    found_files = False
-
-    for root, dirs, files in os.walk(repo_path):
-        for file in files:
-            if file.endswith(".py"):
-                found_files = True
-                file_path = os.path.join(root, file)
-
-                try:
-                    tree = generate_ast_for_file(file_path)
-                    if isinstance(tree, ast.Module):  # Ensure it's an AST module
-                        combined_body.extend(tree.body)  # Extract body only
-                except Exception as e:
-                    print(f"Error processing {file_path}: {e}")
-
-    if not found_files:
-        print("No Python (.py) files found in the repository.")
-
-    # Ensure the final AST is correctly structured
-    combined_tree = ast.Module(body=combined_body, type_ignores=[])
-    BatchAPIDetector().link_parent_nodes(combined_tree)  # Link parent nodes
+def generate_combined_ast_for_repo(repo, workers=None):
+    """Generate a combined AST for the entire repository (path or prebuilt RepoIndex)."""
+    combined_tree = load_repo_index(repo, workers=workers).combined_tree
+    if combined_tree is None:
+        combined_tree = ast.Module(body=[], type_ignores=[])
     return combined_tree  # Return the properly formatted AST
 
 
 
 
+# ML service methods per cloud provider, built once at import time
+PROVIDER_SERVICES = {
+    # Azure ML and Cognitive Services
+    'Azure': frozenset({
+        "detect_language", "analyze_sentiment","begin_abstract_summary","begin_analyze_actions", "begin_extract_summary","begin_multi_label_classify",
+        "begin_recognize_custom_entities","begin_single_label_classify",
+        "extract_key_phrases", "recognize_pii_entities",
+        "recognize_entities", "recognize_linked_entities", "analyze_image",
+        "describe_image", "recognize_text", "detect_faces", "speech_to_text","describe_image_in_stream",
+        "text_to_speech", "speech_translation", "translate_text", "train_model","automl_run","add_face_from_stream"
+    }),
+    # AWS ML Services
+    'AWS': frozenset({
+        "detect_dominant_language", "detect_sentiment", "detect_key_phrases",
+        "detect_entities", "detect_syntax", "detect_labels", "detect_faces",
+        "analyze_video", "recognize_celebrities", "translate_text", "text_to_speech",
+        "speech_to_text", "train_model", "deploy_model", "automl"
+    }),
+    # Google Cloud AI and ML Services
+    'Google': frozenset({
+        "analyze_entities", "analyze_sentiment", "analyze_syntax",
+        "classify_text", "analyze_entity_sentiment", "label_detection",
+        "object_localization", "image_properties", "face_detection",
+        "text_detection", "translate_text", "speech_to_text", "text_to_speech",
+        "train_model", "deploy_model", "automl", "model_monitoring",
+        "custom_model_training", "explainable_ai","long_running_recognize", "translate","synthesize_speech"
+    }),
+}
+
+
 # Visitor class to analyze function calls in the AST
-class FunctionCallVisitor(ast.NodeVisitor):
-    def __init__(self, file_path, trees):
+class FunctionCallVisitor(Rule):
+    def __init__(self, file_path, trees, index=None):
         self.file_path = file_path  # Store file path for reference in messages
+        self.index = index  # RepoIndex, used to report notebook cells instead of raw lines
         self.call_count = 0
         self.trees = trees
-        self.inside_loop = 0  # Track nested loop depth
         self.misuses = set()  # Set to track unique misuse occurrences
+        # The provider depends only on the file's imports, so it is resolved once per file
+        self.services = PROVIDER_SERVICES.get(detect_cloud_provider(trees), frozenset())
 
-    def visit_For(self, node):
-        # Entering a loop increases the loop depth
-        self.inside_loop += 1
-        # Visit the loop body to check for function calls inside
-        self.generic_visit(node)
-        # After visiting the loop body, exit the loop and decrease the loop depth
-        self.inside_loop -= 1
+    def visit(self, tree):
+        if self.services:  # No known provider: no call can match
+            super().visit(tree)
 
     def visit_Call(self, node):
-        
-        detected_provider = detect_cloud_provider(self.trees)
-
-        if detected_provider == 'Azure':
-            # Azure ML and Cognitive Services
-            services = {
-                 "detect_language", "analyze_sentiment","begin_abstract_summary","begin_analyze_actions", "begin_extract_summary","begin_multi_label_classify",
-                "begin_recognize_custom_entities","begin_single_label_classify",""
-                "extract_key_phrases", "recognize_pii_entities",
-                "recognize_entities", "recognize_linked_entities", "analyze_image",
-                "describe_image", "recognize_text", "detect_faces", "speech_to_text","describe_image_in_stream",
-                "text_to_speech", "speech_translation", "translate_text", "train_model","automl_run","add_face_from_stream"
-            }
-        elif detected_provider == 'AWS':
-            # AWS ML Services
-            services = {
-                "detect_dominant_language", "detect_sentiment", "detect_key_phrases",
-                "detect_entities", "detect_syntax", "detect_labels", "detect_faces",
-                "analyze_video", "recognize_celebrities", "translate_text", "text_to_speech",
-                "speech_to_text", "train_model", "deploy_model", "automl"
-            }
-        elif detected_provider == 'Google':
-            # Google Cloud AI and ML Services
-            services = {
-                "analyze_entities", "analyze_sentiment", "analyze_syntax",
-                "classify_text", "analyze_entity_sentiment", "label_detection",
-                "object_localization", "image_properties", "face_detection",
-                "text_detection", "translate_text", "speech_to_text", "text_to_speech",
-                "train_model", "deploy_model", "automl", "model_monitoring",
-                "custom_model_training", "explainable_ai","long_running_recognize", "translate","synthesize_speech"
-            }
-        else:
-            services = {}
+        services = self.services
 
         if isinstance(node.func, ast.Attribute):  # Ensure that func is an Attribute node (method call)
             if node.func.attr in services:  # Check if the method is in the services set
@@ -90,11 +67,12 @@ class FunctionCallVisitor(ast.NodeVisitor):
                     service_name = node.func.attr
                     service_message = f"{service_name}"
 
-                    if self.inside_loop > 0:  # Inside a loop
+                    # The engine tracks the enclosing loops; only for loops count here
+                    if any(isinstance(loop, ast.For) for loop in self.context.loops):  # Inside a loop
                         if argument_type == "plural":
-                            print(f"Not misuse: '{service_message}' found inside a loop with plural argument at line {node.lineno} of {self.file_path}")
+                            print(f"Not misuse: '{service_message}' found inside a loop with plural argument at {self.location(node.lineno)}")
                         else:
-                            misuse_message = f"Misuse: '{service_message}' found inside a loop with single argument at line {node.lineno} of {self.file_path}"
+                            misuse_message = f"Misuse: '{service_message}' found inside a loop with single argument at {self.location(node.lineno)}"
                             if misuse_message not in self.misuses:
                                 self.misuses.add(misuse_message)
                                 print(misuse_message)
@@ -102,12 +80,14 @@ class FunctionCallVisitor(ast.NodeVisitor):
 
                     else:  # Outside a loop
                         if argument_type == "plural":
-                            print(f"Not misuse: '{service_message}' found outside a loop with plural argument at line {node.lineno} of {self.file_path}")
+                            print(f"Not misuse: '{service_message}' found outside a loop with plural argument at {self.location(node.lineno)}")
                         else:
-                            print(f"Check context and business requirements for '{service_message}' found outside a loop with single argument at line {node.lineno} of {self.file_path}")
+                            print(f"Check context and business requirements for '{service_message}' found outside a loop with single argument at {self.location(node.lineno)}")
 
-        # Continue visiting child nodes
-        self.generic_visit(node)
+    def location(self, lineno):
+        if self.index is not None:
+            return self.index.location(self.file_path, lineno)
+        return f"line {lineno} of {self.file_path}"
 
     def check_argument_type(self, node):
         if node.args:
@@ -123,13 +103,13 @@ class FunctionCallVisitor(ast.NodeVisitor):
             return self.misuses  # Return the collected misuses
 
 
-def analyze_function_calls_in_repo(trees):
+def analyze_function_calls_in_repo(trees, index=None):
     total_misuse_count = 0  # Total occurrences of misuse across all files
     all_misuses = set()  # Store all misuses
 
     for file_path, tree in trees:
         print(f"Processing file: {file_path} (AST type: {type(tree)})")  # Debug: Check the type of AST being processed
-        visitor = FunctionCallVisitor(file_path, tree)  # Pass single tree
+        visitor = FunctionCallVisitor(file_path, tree, index)  # Pass single tree
         visitor.visit(tree)
         total_misuse_count += visitor.call_count
         all_misuses.update(visitor.get_misuses())  # Collect misuses
@@ -139,36 +119,56 @@ def analyze_function_calls_in_repo(trees):
 
 
 
-class BatchAPIDetector(ast.NodeVisitor):
+# Facts about one function of a module. Callees are kept as written ("f", "mod.f",
+# "self.f", or ".f" when the receiver is not a plain name) and resolved later
+# against the whole repository, so a summary depends only on its own file.
+# loop_calls holds (callee, lineno) pairs and misuses (message, lineno) pairs.
+FunctionSummary = namedtuple("FunctionSummary", "calls loop_calls calls_api misuses")
+
+# Summaries are memoized per tree, so a module is analyzed once however often the graph is rebuilt
+MODULE_SUMMARIES = weakref.WeakKeyDictionary()
+# ASTCache namespace of the summaries; bump the version whenever BatchAPIDetector changes
+SUMMARY_NAMESPACE = "batch-api-summary-1"
+
+
+class BatchAPIDetector(Rule):
+    """Summarize the functions of one module: the calls they make, in and out of loops, and direct API calls."""
+
+    API_FUNCTION_NAMES = frozenset({"post", "get", "put", "delete", "begin_analyze_document_from_url"})
+
     def __init__(self):
-        self.function_defs = {}  # Tracks all function definitions
+        self.parents = None  # ParentIndex of the tree being visited
+        self.function_defs = {}  # Tracks all function definitions {qualified name in module: node}
         self.calls_in_loops = {}  # Functions called inside loops {caller: [called_funcs]}
         self.function_calls = {}  # Function-to-function call mapping
         self.api_calls = set()  # Functions that directly call an API
-        self.misuses = []  # List of misuse violations
+        self.misuses = {}  # Misuse violations found inside a function {caller: [messages]}
+        self.qualified_names = {}  # id(function node) -> qualified name in module
 
     def visit_FunctionDef(self, node):
         # Record function definitions and initialize their call lists
-        self.function_defs[node.name] = node
-        self.function_calls[node.name] = []
-        self.generic_visit(node)
+        name = self.qualified_name(node)
+        self.function_defs[name] = node
+        self.function_calls[name] = []
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def visit(self, tree):
+        self.parents = ParentIndex(tree)
+        super().visit(tree)
 
     def visit_Call(self, node):
         current_function = self.get_enclosing_function(node)
+        if current_function is None:
+            return  # Module-level code is not part of the call graph
+        callee = self.call_target(node)
 
         # Track function calls
-        if current_function:
-            if isinstance(node.func, ast.Name):  # Direct call
-                self.function_calls[current_function].append(node.func.id)
-            elif isinstance(node.func, ast.Attribute):  # Attribute-based call
-                self.function_calls[current_function].append(node.func.attr)
-
+        if callee:
+            self.function_calls[current_function].append(callee)
             # Check if the call is inside a loop
             if self.is_inside_loop(node):
-                if isinstance(node.func, ast.Name):
-                    self.calls_in_loops.setdefault(current_function, []).append(node.func.id)
-                elif isinstance(node.func, ast.Attribute):
-                    self.calls_in_loops.setdefault(current_function, []).append(node.func.attr)
+                self.calls_in_loops.setdefault(current_function, []).append((callee, node.lineno))
 
         # Detect API calls and potential misuse with 'model_id'
         if self.is_api_call(node):
@@ -177,68 +177,257 @@ class BatchAPIDetector(ast.NodeVisitor):
             # Check for misuse of 'model_id' argument in API calls inside loops
             for keyword in getattr(node, "keywords", []):
                 if keyword.arg == "model_id" and self.is_inside_loop(node):
-                    self.misuses.append((current_function, "API call with 'model_id' inside a loop"))
-
-        self.generic_visit(node)
+                    self.misuses.setdefault(current_function, []).append(
+                        ("API call with 'model_id' inside a loop", node.lineno))
 
     def is_inside_loop(self, node):
-        # Ascend the tree to determine if node is inside a loop
-        while node:
-            if isinstance(node, (ast.For, ast.While)):
-                return True
-            node = getattr(node, 'parent', None)
-        return False
+        # Nearest enclosing loop comes from the parent index, no upward walk
+        return isinstance(node, LOOP_TYPES) or self.parents.enclosing_loop(node) is not None
 
     def is_api_call(self, node):
         # Detect API calls based on known API method names
-        api_function_names = {"post", "get", "put", "delete", "begin_analyze_document_from_url"}
         if isinstance(node.func, ast.Attribute):
-            return node.func.attr in api_function_names
+            return node.func.attr in self.API_FUNCTION_NAMES
         return False
 
+    def qualified_name(self, node):
+        """Dotted name of a function inside its module, e.g. "Client.fetch" or "outer.inner"."""
+        name = self.qualified_names.get(id(node))
+        if name is None:
+            parts = [node.name]
+            parent = self.parents.parent(node)
+            while parent is not None:
+                if isinstance(parent, FUNCTION_TYPES):
+                    parts.append(self.qualified_name(parent))
+                    break
+                if isinstance(parent, ast.ClassDef):
+                    parts.append(parent.name)
+                parent = self.parents.parent(parent)
+            name = self.qualified_names[id(node)] = ".".join(reversed(parts))
+        return name
+
     def get_enclosing_function(self, node):
-        # Ascend the tree to find the enclosing function
-        while node:
-            if isinstance(node, ast.FunctionDef):
-                return node.name
-            node = getattr(node, 'parent', None)
+        # Qualified name of the nearest enclosing function, looked up in the parent index
+        if isinstance(node, FUNCTION_TYPES):
+            return self.qualified_name(node)
+        function = self.parents.enclosing_function(node)
+        return self.qualified_name(function) if function is not None else None
+
+    @staticmethod
+    def call_target(node):
+        """The callee as written: "f", "a.b.f", or ".f" when the receiver is an expression."""
+        func = node.func
+        if isinstance(func, ast.Name):
+            return func.id
+        if not isinstance(func, ast.Attribute):
+            return None
+        parts = [func.attr]
+        value = func.value
+        while isinstance(value, ast.Attribute):
+            parts.append(value.attr)
+            value = value.value
+        if not isinstance(value, ast.Name):
+            return "." + func.attr
+        parts.append(value.id)
+        return ".".join(reversed(parts))
+
+    def summary(self):
+        """Return {qualified name in module: FunctionSummary} for the visited module."""
+        return {
+            name: FunctionSummary(
+                tuple(self.function_calls[name]),
+                tuple(self.calls_in_loops.get(name, ())),
+                name in self.api_calls,
+                tuple(self.misuses.get(name, ())),
+            )
+            for name in self.function_defs
+        }
+
+
+def summarize_module(tree, source_code=None, cache=None):
+    """
+    Return the (memoized) function summaries of one module tree. Given the source
+    of the module and an ASTCache, they are also stored with the cached tree, so
+    unchanged files are not analyzed again on later runs.
+    """
+    summary = MODULE_SUMMARIES.get(tree)
+    if summary is None and cache is not None and source_code is not None:
+        summary = cache.get(source_code, SUMMARY_NAMESPACE)
+    if summary is None:
+        detector = BatchAPIDetector()
+        detector.visit(tree)
+        summary = detector.summary()
+        if cache is not None and source_code is not None:
+            cache.put(source_code, summary, SUMMARY_NAMESPACE)
+    MODULE_SUMMARIES[tree] = summary
+    return summary
+
+
+def module_name(file_path, repo_path=None):
+    """Dotted module name of a file relative to the repository root ("pkg/mod.py" -> "pkg.mod")."""
+    if repo_path:
+        file_path = os.path.relpath(file_path, repo_path)
+    parts = os.path.splitext(os.path.normpath(file_path))[0].split(os.sep)
+    if parts[-1] == "__init__" and len(parts) > 1:
+        parts.pop()
+    return ".".join(part for part in parts if part not in ("", ".", ".."))
+
+
+class CallGraph:
+    """
+    Repository call graph over module-qualified function names.
+
+    Callees are resolved through the caller's own module, its imports (ImportTable
+    aliases) and, for method calls on self/cls, its class; calls that stay ambiguous
+    fall back to the only function of that name in the repository, if there is one.
+    Whether a function (transitively) calls an ML API is then propagated over the
+    strongly connected components in reverse topological order, which handles
+    recursion and arbitrarily deep helper chains in linear time.
+
+    Summaries come from summarize_module, through the ASTCache when one is given
+    along with the sources of the files.
+    """
+
+    def __init__(self, trees, repo_path=None, sources=None, cache=None):
+        sources = sources or {}
+        self.summaries = {}  # qualified name -> FunctionSummary
+        self.module_of = {}  # qualified name -> (module, name in module)
+        self.file_of = {}  # qualified name -> file path
+        self.imports = {}  # module -> ImportTable
+        self.by_suffix = {}  # every dotted suffix of a module name -> {modules}
+        self.by_name = {}  # bare function name -> [qualified names]
+        for file_path, tree in trees:
+            module = module_name(file_path, repo_path)
+            self.imports[module] = import_table(tree)
+            parts = module.split(".")
+            for i in range(len(parts)):
+                self.by_suffix.setdefault(".".join(parts[i:]), set()).add(module)
+            for local_name, summary in summarize_module(tree, sources.get(file_path), cache).items():
+                qualified = f"{module}.{local_name}"
+                self.summaries[qualified] = summary
+                self.module_of[qualified] = (module, local_name)
+                self.file_of[qualified] = file_path
+                self.by_name.setdefault(local_name.rsplit(".", 1)[-1], []).append(qualified)
+        self.edges = {name: self._resolve_all(name, summary.calls) for name, summary in self.summaries.items()}
+        self.api_functions = self._propagate()
+
+    def _lookup(self, dotted):
+        """Find a repository function from a fully qualified dotted name, e.g. "pkg.mod.Class.f"."""
+        parts = dotted.split(".")
+        for i in range(len(parts) - 1, 0, -1):
+            modules = self.by_suffix.get(".".join(parts[:i]), ())
+            if len(modules) == 1:
+                qualified = f"{next(iter(modules))}.{'.'.join(parts[i:])}"
+                if qualified in self.summaries:
+                    return qualified
         return None
 
-    def link_parent_nodes(self, node, parent=None):
-        # Recursively link parent nodes for traversal
-        node.parent = parent
-        for child in ast.iter_child_nodes(node):
-            self.link_parent_nodes(child, node)
-
-    def propagate_api_calls(self):
-        # Propagate API call status through the call graph
-        for function, calls in self.function_calls.items():
-            for called_func in calls:
-                if called_func in self.api_calls:
-                    self.api_calls.add(function)
-
-    def detect_batch_misuses(self):
-        # Propagate API call status first
-        self.propagate_api_calls()
-
-        # Detect misuse of batch APIs
-        for caller, called_funcs in self.calls_in_loops.items():
-            for called_func in called_funcs:
-                if called_func in self.api_calls:
-                    self.misuses.append((caller, called_func))
-
-        return self.misuses
-
-
-def detect_batch(tree):
-    if not isinstance(tree, ast.Module):
-        raise ValueError(f"Expected an AST Module, but got {type(tree)}")
-    detector = BatchAPIDetector()
-    detector.link_parent_nodes(tree)  # Ensure parent nodes are linked for traversal
-    detector.visit(tree)  # Traverse the tree
+    def resolve(self, caller, callee):
+        """Return the qualified names a call written as `callee` inside `caller` may reach."""
+        module, local_name = self.module_of[caller]
+        name = callee.rsplit(".", 1)[-1]
+        if not callee.startswith("."):
+            head, _, rest = callee.partition(".")
+            candidates = []
+            if head in ("self", "cls") and rest == name and "." in local_name:
+                candidates.append(f"{module}.{local_name.rsplit('.', 1)[0]}.{name}")
+            candidates.append(f"{module}.{callee}")  # Module-level function or Class.method
+            if "." in local_name:
+                candidates.append(f"{module}.{local_name.rsplit('.', 1)[0]}.{callee}")  # Nested function
+            for candidate in candidates:
+                if candidate in self.summaries:
+                    return [candidate]
+            alias = self.imports[module].aliases.get(head)
+            if alias is not None:
+                found = self._lookup(f"{alias}.{rest}" if rest else alias)
+                return [found] if found else []  # Imported from outside the repository
+        same_name = self.by_name.get(name, ())
+        in_module = [qualified for qualified in same_name if self.module_of[qualified][0] == module]
+        if in_module:
+            return in_module
+        return list(same_name) if len(same_name) == 1 else []
+
+    def _resolve_all(self, caller, callees):
+        resolved = []
+        for callee in dict.fromkeys(callees):
+            resolved.extend(self.resolve(caller, callee))
+        return resolved
+
+    def strongly_connected_components(self):
+        """Tarjan's algorithm, iteratively; components come out in reverse topological order."""
+        index_of, lowlink, on_stack = {}, {}, set()
+        stack, components = [], []
+        for root in self.edges:
+            if root in index_of:
+                continue
+            work = [(root, iter(self.edges[root]))]
+            index_of[root] = lowlink[root] = len(index_of)
+            stack.append(root)
+            on_stack.add(root)
+            while work:
+                node, children = work[-1]
+                for child in children:
+                    if child not in index_of:
+                        index_of[child] = lowlink[child] = len(index_of)
+                        stack.append(child)
+                        on_stack.add(child)
+                        work.append((child, iter(self.edges[child])))
+                        break
+                    if child in on_stack:
+                        lowlink[node] = min(lowlink[node], index_of[child])
+                else:
+                    work.pop()
+                    if work:
+                        parent = work[-1][0]
+                        lowlink[parent] = min(lowlink[parent], lowlink[node])
+                    if lowlink[node] == index_of[node]:
+                        component = []
+                        while True:
+                            member = stack.pop()
+                            on_stack.discard(member)
+                            component.append(member)
+                            if member == node:
+                                break
+                        components.append(component)
+        return components
+
+    def _propagate(self):
+        """Set of functions that call an ML API directly or through any chain of callees."""
+        api_functions = set()
+        for component in self.strongly_connected_components():
+            # Callees outside the component were finished earlier
+            if any(self.summaries[name].calls_api or any(callee in api_functions for callee in self.edges[name])
+                   for name in component):
+                api_functions.update(component)
+        return api_functions
+
+    def misuses(self):
+        """
+        (caller, message, file_path, lineno) tuples: calls made in a loop to a
+        function reaching an ML API, and misuses found inside the caller itself.
+        """
+        misuses = []
+        for caller, summary in self.summaries.items():
+            file_path = self.file_of[caller]
+            misuses.extend((caller, message, file_path, lineno) for message, lineno in summary.misuses)
+            for callee, lineno in dict.fromkeys(summary.loop_calls):
+                for target in self.resolve(caller, callee):
+                    if target in self.api_functions:
+                        message = f"'{target}', which calls an ML API, called inside a loop"
+                        misuses.append((caller, message, file_path, lineno))
+        return misuses
+
+
+def detect_batch(trees, repo_path=None, sources=None, cache=None):
+    """Detect ML API functions called in loops; trees is [(file_path, tree)] or a single module."""
+    if isinstance(trees, ast.Module):
+        trees = [("<module>", trees)]
+    elif isinstance(trees, ast.AST):
+        raise ValueError(f"Expected an AST Module, but got {type(trees)}")
+    graph = CallGraph(trees, repo_path, sources, cache)
 
     # Detect batch API misuses
-    misuses = detector.detect_batch_misuses()
+    misuses = graph.misuses()
 
     print(f"Total occurences of Misuses Detected in a linked function: {len(misuses)}")
     print(f"Misuses Details: {misuses}")
@@ -246,9 +435,9 @@ def detect_batch(tree):
 
 
 
-def detect_function_calls(trees, combined_tree): 
-    misuse_count, misuses = analyze_function_calls_in_repo(trees)
-    #misuses1, additional_misuse_count = detect_batch(combined_tree)
+def detect_function_calls(index): 
+    misuse_count, misuses = analyze_function_calls_in_repo(index.trees, index)
+    #misuses1, additional_misuse_count = detect_batch(index.trees, index.repo_path)
 
     #total_misuse_count = misuse_count + additional_misuse_count
     all_misuses = list(set(misuses))
@@ -263,6 +452,6 @@ def detect_function_calls(trees, combined_tree):
 
 
 
-def detect(repo_path):
+def detect(repo):
     from detection.output import process_repos
-    return process_repos([repo_path], detect_function_calls, save_to_excel=True, file_name="misuses_report.xlsx")
+    return process_repos([repo], detect_function_calls, save_to_excel=True, file_name="misuses_report.xlsx")
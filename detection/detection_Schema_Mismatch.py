@@ -2,69 +2,70 @@
 from detection.common import *
 from detection.output import *
 
-class DatasetAnalyzer(ast.NodeVisitor):
+class DatasetAnalyzer(Rule):
+    """
+    Train/test dataflow index: the variables holding training and testing data.
+
+    Filled in one pass from train_test_split assignments and from the arguments of
+    training (fit, train, ...) and testing (predict, evaluate, ...) calls. Variables
+    are kept in insertion-ordered dicts, so each one is recorded once however often
+    it is used.
+    """
+
+    TRAIN_METHODS = frozenset({'train', 'fit', 'train_model', 'start_training', 'train_input', 'fit_model'})
+    TEST_METHODS = frozenset({'predict', 'evaluate', 'test', 'predict_model', 'evaluate_model', 'deploy'})
+
     def __init__(self):
         # To track train and test data pairs
-        self.train_data = []
-        self.test_data = []
-        self.train_test_split_results = []
+        self.train_data = {}  # variable name -> None, used as an ordered set
+        self.test_data = {}
+        self.train_test_split_results = {}  # (train, test, ...) tuple -> None
 
     def visit_Assign(self, node):
-        # Debugging: print the node to inspect its structure
-        #print("Visiting Assign Node:", ast.dump(node, indent=4))
-
         # Check if the assignment is unpacking a result from train_test_split
         if isinstance(node.value, ast.Call):
-            func_name = node.value.func.id if isinstance(node.value.func, ast.Name) else None
+            func = node.value.func
+            func_name = func.id if isinstance(func, ast.Name) else func.attr if isinstance(func, ast.Attribute) else None
 
             # Handle train_test_split specifically
-            if func_name == 'train_test_split':
-                # Extract the variables on the left-hand side of the assignment (e.g., x1_train, y1_train)
-                if isinstance(node.targets[0], ast.Tuple):
-                    # Extract variable names from the tuple on the left-hand side of the assignment
-                    assigned_vars = [target.id for target in node.targets[0].elts if isinstance(target, ast.Name)]
-                    if len(assigned_vars) == 4:
-                        # Expecting something like: (x1_train, y1_train, x1_test, y1_test)
-                        self.train_test_split_results.append(tuple(assigned_vars))  # Store as a tuple
-
-        # Call generic_visit to visit any other nodes
-        self.generic_visit(node)
-
+            if func_name == 'train_test_split' and isinstance(node.targets[0], ast.Tuple):
+                # Extract variable names from the tuple on the left-hand side of the assignment
+                assigned_vars = [target.id for target in node.targets[0].elts if isinstance(target, ast.Name)]
+                if len(assigned_vars) == 4:
+                    # Expecting x_train, x_test, y_train, y_test: a (train, test) pair per array
+                    self.train_test_split_results.setdefault(tuple(assigned_vars))
+                    for name in assigned_vars[0::2]:
+                        self.train_data.setdefault(name)
+                    for name in assigned_vars[1::2]:
+                        self.test_data.setdefault(name)
 
     def visit_Call(self, node):
         # Check if the function being called is related to training or testing
         if isinstance(node.func, ast.Attribute):
             func_name = node.func.attr
 
-            # Detect training functions
-            train_methods = ['train', 'fit', 'train_model', 'start_training', 'train_input', 'fit_model']
-            # Detect testing functions
-            test_methods = ['predict', 'evaluate', 'test', 'predict_model', 'evaluate_model', 'deploy']
-
             # If it's a training method, capture the arguments (train data)
-            if func_name in train_methods:
-                arguments = [arg.id for arg in node.args if isinstance(arg, ast.Name)]
-                if arguments:
-                    self.train_data.extend(arguments)  # Add train data to the list
+            if func_name in self.TRAIN_METHODS:
+                for arg in node.args:
+                    if isinstance(arg, ast.Name):
+                        self.train_data.setdefault(arg.id)
 
             # If it's a testing method, capture the arguments (test data)
-            if func_name in test_methods:
-                arguments = [arg.id for arg in node.args if isinstance(arg, ast.Name)]
-                if arguments:
-                    self.test_data.extend(arguments)  # Add test data to the list
-
-        self.generic_visit(node)
-
-    def analyze(self, tree):
-        self.visit(tree)
+            if func_name in self.TEST_METHODS:
+                for arg in node.args:
+                    if isinstance(arg, ast.Name):
+                        self.test_data.setdefault(arg.id)
+
+    def analyze(self, tree=None):
+        # Visit only if the tree was not already visited, to avoid collecting every entry twice
+        if tree is not None:
+            self.visit(tree)
         if (len(self.train_data) != 0 and len(self.test_data) != 0) or (len(self.train_test_split_results) != 0):
             return True
         return False  # It's good practice to return something even if the condition isn't met
 
-        #return {train_data": self.train_data,"test_data": self.test_data,"train_test_split_results": self.train_test_split_results}
-
 
-class ProviderFunctionVisitor(ast.NodeVisitor):
+class ProviderFunctionVisitor(Rule):
     def __init__(self, cloud_provider):
         """
         Initialize the visitor for schema mismatch testing based on the cloud provider.
@@ -92,7 +93,6 @@ class ProviderFunctionVisitor(ast.NodeVisitor):
         for alias in node.names:
             if alias.name == self.libraries.get("library"):
                 self.is_imported = True
-        self.generic_visit(node)
 
     def visit_ImportFrom(self, node):
         """
@@ -100,7 +100,6 @@ class ProviderFunctionVisitor(ast.NodeVisitor):
         """
         if node.module == self.libraries.get("library"):
             self.is_imported = True
-        self.generic_visit(node)
 
     def visit_Call(self, node):
         """
@@ -110,70 +109,69 @@ class ProviderFunctionVisitor(ast.NodeVisitor):
             library_function = self.libraries.get("function")
             if isinstance(node.func, ast.Attribute) and node.func.attr == library_function:
                 self.is_used = True
-        self.generic_visit(node)
 
 
-class SchemaCheckVisitor(ast.NodeVisitor):
+def extract_base_variable(node):
+    """
+    Extract the base variable of a Name, Attribute or Subscript chain (x, x.shape, x["col"].dtype).
+    """
+    while isinstance(node, (ast.Attribute, ast.Subscript)):
+        node = node.value
+    return node.id if isinstance(node, ast.Name) else None
+
+
+class SchemaCheckVisitor(Rule):
     def __init__(self,train_data,test_data):
         """
-        Initialize with train_data and test_data, which are lists of train and test variables respectively.
+        Initialize with train_data and test_data, the train and test variables of a DatasetAnalyzer.
+        They may still be filling up while this visitor runs: comparisons are only
+        recorded as node references and matched against them when schema_checks is read.
         """
-        self.schema_checks = []  # To store schema comparison details
-        self.assignments = {}    # Map variable names to their assigned AST nodes
+        self.comparisons = []  # (Compare node, left base variable, right base variable)
         self.train_data = train_data
         self.test_data = test_data
 
-    def visit_Assign(self, node):
-        """
-        Track assignments in the code.
-        """
-        if isinstance(node.targets[0], ast.Name):
-            var_name = node.targets[0].id
-            self.assignments[var_name] = node.value
-        self.generic_visit(node)
-
     def visit_Compare(self, node):
         """
-        Check if a comparison involves variables, attributes, or subscript access from self.train_data
-        and self.test_data (or vice versa).
+        Record comparisons between two variables, attributes, or subscript accesses.
         """
-        def extract_base_variable(node):
-            """
-            Recursively extract the base variable from an AST node.
-            """
-            if isinstance(node, ast.Name):
-                return node.id
-            elif isinstance(node, ast.Attribute):
-                return extract_base_variable(node.value)
-            elif isinstance(node, ast.Subscript):
-                return extract_base_variable(node.value)
-            return None
-
         # Extract left and right base variables
         left_var = extract_base_variable(node.left)
         right_var = extract_base_variable(node.comparators[0]) if node.comparators else None
-
-        # Check for cross train-test comparisons
         if left_var and right_var:
+            self.comparisons.append((node, left_var, right_var))
+
+    @property
+    def schema_checks(self):
+        """
+        Comparisons between a train variable and a test variable (or vice versa).
+        "comparison" is the Compare node; use describe() to render it.
+        """
+        checks = []
+        for node, left_var, right_var in self.comparisons:
+            # Check for cross train-test comparisons
             if ((left_var in self.train_data and right_var in self.test_data) or
                 (left_var in self.test_data and right_var in self.train_data)):
-                self.schema_checks.append({
+                checks.append({
                     "train_var": left_var if left_var in self.train_data else right_var,
                     "test_var": right_var if right_var in self.test_data else left_var,
-                    "comparison": ast.dump(node)
+                    "comparison": node
                 })
+        return checks
 
-        self.generic_visit(node)
-
-
+    @staticmethod
+    def describe(check, index=None):
+        """Render a schema check for reporting, located through the RepoIndex when given."""
+        node = check['comparison']
+        where = index.node_location(node) if index is not None else f"line {node.lineno}"
+        return f"{check['train_var']} vs {check['test_var']}: {ast.unparse(node)} ({where})"
 
     def visit_FunctionDef(self, node):
         """
         Skip trivial or empty functions when traversing.
         """
         if self.is_empty_or_trivial(node):
-            return  # Skip trivial functions
-        self.generic_visit(node)
+            return PRUNE  # Skip trivial functions
 
     def is_empty_or_trivial(self, node):
         """
@@ -196,7 +194,7 @@ class SchemaCheckVisitor(ast.NodeVisitor):
         return self.schema_checks
 
 
-def analyze_code(tree):
+def analyze_code(tree, index=None):
         cloud_provider = detect_cloud_provider(tree)
         misuse_count =0
         schema_check_found = False
@@ -213,16 +211,16 @@ def analyze_code(tree):
         schema_test_identifier = SchemaCheckVisitor(train_data,test_data)
         provider_function_visitor = ProviderFunctionVisitor(cloud_provider)
 
-        # Visit the parsed tree with each visitor
-        analyzer.visit(tree)
+        # Visit the parsed tree with both visitors in a single pass
+        run_rules(tree, [analyzer, schema_test_identifier])
         #provider_function_visitor.visit(tree)
-        schema_test_identifier.visit(tree)
+        schema_checks = schema_test_identifier.schema_checks
 
         # Step 1: Test Data Analysis
         print("Test Data Analysis:")
 
 
-        if analyzer.analyze(tree):
+        if analyzer.analyze():
             print("Both training and testing data are present.")
 
             # Step 2:Import Analysis based on detected cloud provider
@@ -260,10 +258,10 @@ def analyze_code(tree):
                     if not schema_test_identifier.is_empty_or_trivial(node):
                         # Proceed with schema check analysis for non-trivial functions
                         result = f"\nAnalyzing function: {node.name}"
-                        if schema_test_identifier.schema_checks:
+                        if schema_checks:
                             result += "\nSchema checks found:"
-                            for check in schema_test_identifier.schema_checks:
-                                result += f"\n{ast.dump(check)}"
+                            for check in schema_checks:
+                                result += f"\n{schema_test_identifier.describe(check, index)}"
                             schema_check_found = True
                         else:
                             result += "\nNo schema checks found."
@@ -282,9 +280,9 @@ def analyze_code(tree):
         print(f"There are {misuse_count} Ignore testing schema mimsatch misuses detected")
         return misuse_count
 
-def detect_schema_misuse(tree):
-    misuse_count = analyze_code(tree)
+def detect_schema_misuse(index):
+    misuse_count = analyze_code(index.combined_tree, index)
     return {"misuse_count_of_Testing_Schema_Mismatch": misuse_count}
 
-def detect(repo_path):
-    return process_repos([repo_path], detect_schema_misuse, save_to_excel=True, file_name="misuses_report.xlsx")
+def detect(repo):
+    return process_repos([repo], detect_schema_misuse, save_to_excel=True, file_name="misuses_report.xlsx")
@@ -3,59 +3,51 @@ from detection.common import *
 from detection.output import *
 
 
-class SDKImportAnalyzer(ast.NodeVisitor):
-    """
-    Analyzes SDK-specific imports in a given AST.
-    """
-
-    def __init__(self, sdk_imports: Dict[str, List[str]]):
-        self.sdk_imports = sdk_imports
-        self.detected_sdk = "None - an API is used"
-
-    def visit_Import(self, node: ast.Import):
-        self._analyze_imports(node.names)
-        self.generic_visit(node)
-
-    def visit_ImportFrom(self, node: ast.ImportFrom):
-        self._analyze_imports(node.names)
-        self.generic_visit(node)
-
-    def _analyze_imports(self, aliases):
-        for alias in aliases:
-            for sdk, keywords in self.sdk_imports.items():
-                if any(keyword in alias.name for keyword in keywords):
-                    self.detected_sdk = sdk
-                    return  # Exit early once an SDK is detected
-
-
-class CheckpointUsageAnalyzer(ast.NodeVisitor):
+class CheckpointUsageAnalyzer(Rule):
     """
     Analyzes checkpoint-related function calls in a given AST.
     """
 
-    def __init__(self, checkpoint_keywords: List[str]):
+    def __init__(self, checkpoint_keywords: List[str], resolver=None):
         self.checkpoint_keywords = checkpoint_keywords
+        # One search per call for all keywords, instead of one substring scan per keyword
+        self.keywords_re = re.compile("|".join(map(re.escape, checkpoint_keywords))) if checkpoint_keywords else None
+        self.fixed_resolver = resolver  # By default, each visited tree resolves names through its own imports
+        self.resolver = resolver
+        self.matches = {}  # qualified name -> (is checkpoint call, is restore call)
         self.usage = {
             "checkpoint_used": False,
             "checkpoint_restored": False,
             "misuse_detected": False,
         }
 
+    def visit(self, tree):
+        if self.keywords_re is None:
+            return  # No keywords, no call can match
+        self.resolver = self.fixed_resolver or name_resolver(tree)
+        super().visit(tree)
+
     def visit_Call(self, node: ast.Call):
-        func_name = CheckpointMisuseDetector.get_function_name(node.func)
-        if any(keyword in func_name for keyword in self.checkpoint_keywords):
+        func_name = self.resolver.call_name(node)
+        match = self.matches.get(func_name)
+        if match is None:
+            is_checkpoint = self.keywords_re.search(func_name) is not None
+            match = self.matches[func_name] = (is_checkpoint, is_checkpoint and ("restore" in func_name or "load" in func_name))
+        if match[0]:
             self.usage["checkpoint_used"] = True
-            if "restore" in func_name or "load" in func_name:
+            if match[1]:
                 self.usage["checkpoint_restored"] = True
-        self.generic_visit(node)
 
 
 class CheckpointMisuseDetector:
-    def __init__(self, repo_ast: ast.Module):
+    def __init__(self, repo_ast: ast.Module, trees=None):
         """
         Initializes the detector with a single AST representing the entire repository.
+        trees, the (file_path, tree) tuples it was combined from, lets checkpoint calls
+        be resolved through the imports of their own file rather than the merged ones.
         """
         self.repo_ast = repo_ast
+        self.trees = trees
         self.sdk_imports = {
             "azure": ["azureml.core", "azureml.train"],
             "google": ["google.cloud", "tensorflow"],
@@ -68,29 +60,33 @@ class CheckpointMisuseDetector:
         }
 
     @staticmethod
-    def get_function_name(node):
+    def get_function_name(node, tree=None):
         """
         Extracts the function name from an AST node.
-        :param node: AST node representing a function call.
+        :param node: AST node representing a function call target.
+        :param tree: Tree the node belongs to; when given, import aliases are resolved.
         :return: The function name as a string.
         """
-        if isinstance(node, ast.Name):
-            return node.id
-        elif isinstance(node, ast.Attribute):
-            # Recursively build the full attribute name (e.g., torch.save)
-            value = CheckpointMisuseDetector.get_function_name(node.value)
-            return f"{value}.{node.attr}" if value else node.attr
-        return ""
+        resolver = name_resolver(tree) if tree is not None else NameResolver()
+        return resolver.qualified_name(node)
 
     def analyze_imports(self, tree: ast.Module) -> str:
         """
-        Uses a visitor to analyze the SDK context from imports.
+        Looks up the SDK context in the import table of the tree.
+        The last import statement naming an SDK wins; within a statement, the first
+        imported name that matches decides.
         :param tree: AST of a Python file.
         :return: Detected SDK (azure, google, aws) or "None - an API is used".
         """
-        analyzer = SDKImportAnalyzer(self.sdk_imports)
-        analyzer.visit(tree)
-        return analyzer.detected_sdk
+        detected_sdk = "None - an API is used"
+        for record in import_table(tree).records:
+            detected_sdk = next(
+                (sdk for name, _ in record.aliases
+                 for sdk, keywords in self.sdk_imports.items()
+                 if any(keyword in name for keyword in keywords)),
+                detected_sdk,
+            )
+        return detected_sdk
 
     def analyze_checkpoint_usage(self, sdk: str, tree: ast.Module) -> Dict[str, bool]:
         """
@@ -101,7 +97,11 @@ class CheckpointMisuseDetector:
         """
         checkpoint_keywords = self.checkpoint_functions.get(sdk, [])
         analyzer = CheckpointUsageAnalyzer(checkpoint_keywords)
-        analyzer.visit(tree)
+        if tree is self.repo_ast and self.trees is not None:
+            for _, file_tree in self.trees:
+                analyzer.visit(file_tree)
+        else:
+            analyzer.visit(tree)
 
         # Determine misuse based on analysis
         if not analyzer.usage["checkpoint_used"] and not analyzer.usage["checkpoint_restored"]:
@@ -142,8 +142,8 @@ class CheckpointMisuseDetector:
 
 
 
-def detect_checkpoint_misuse(tree):
-    detector = CheckpointMisuseDetector(tree)
+def detect_checkpoint_misuse(index):
+    detector = CheckpointMisuseDetector(index.combined_tree, index.trees)
     report = detector.detect_misuse()
 
     # Count the number of misuses (e.g., where misuse_detected is True)
@@ -155,5 +155,5 @@ def detect_checkpoint_misuse(tree):
         "analysis_result": report
     }
 
-def detect(repo_path):
-    return process_repos([repo_path], detect_checkpoint_misuse)
+def detect(repo):
+    return process_repos([repo], detect_checkpoint_misuse)
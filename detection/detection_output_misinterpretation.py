@@ -16,7 +16,9 @@ class ImprovedOutputMisinterpreterConfig:
     """Improved configuration with better coverage of sentiment API patterns"""
    
     def __init__(self):
-        # Enhanced API patterns with more comprehensive detection
+        # Sentiment API rules per provider. Calls, result fields and conditions are
+        # matched on the shape of the AST (see SentimentAPIRules); only the import
+        # indicators and the whole-file text patterns are regular expressions.
         self.api_patterns = {
             'Google': {
                 'sentiment_analysis': {
@@ -27,35 +29,20 @@ class ImprovedOutputMisinterpreterConfig:
                         r'google-cloud-language',
                         r'language_v1'
                     ],
-                    'api_call_patterns': [
-                        r'analyze_sentiment\s*\(',
-                        r'\.analyze_sentiment\s*\(',
-                        r'client\.analyze_sentiment',
-                        r'language_client\.analyze_sentiment',
-                        r'sentiment_analyze'
-                    ],
-                    'result_field_patterns': {
-                        'score': [
-                            r'\.score\b',
-                            r'document_sentiment\.score',
-                            r'sentiment\.score',
-                            r'result\.score',
-                            r'response\.score',
-                            r'\[[\"\']score[\"\']\]',
-                            r'getattr\(.*,\s*["\']score["\']',
-                            r'\.get\(\s*["\']score["\']'
-                        ],
-                        'magnitude': [
-                            r'\.magnitude\b',
-                            r'document_sentiment\.magnitude',
-                            r'sentiment\.magnitude',
-                            r'result\.magnitude',
-                            r'response\.magnitude',
-                            r'\[[\"\']magnitude[\"\']\]',
-                            r'getattr\(.*,\s*["\']magnitude["\']',
-                            r'\.get\(\s*["\']magnitude["\']'
-                        ]
+                    # Substrings of the called function name (client.analyze_sentiment(...), ...)
+                    'api_call_names': ['analyze_sentiment', 'sentiment_analyze'],
+                    # Fields read as x.field, x["field"], x.get("field") or getattr(x, "field")
+                    'result_fields': {
+                        'score': {'names': ['score']},
+                        'magnitude': {'names': ['magnitude']}
                     },
+                    # A condition naming every term of one entry (in distinct places) is correct usage
+                    'correct_usage_terms': [('score', 'magnitude')],
+                    'abs_terms': ['score'],  # abs(...score...) in a condition is correct usage too
+                    # A condition comparing an operand ending with the suffix is a misuse
+                    'misuse_comparisons': [
+                        {'operand_suffix': 'score', 'ops': ['<', '>', '<=', '>=', '=='], 'against': 'number'}
+                    ],
                     'correct_usage_patterns': [
                         r'score.*magnitude|magnitude.*score',
                         r'abs\s*\(\s*.*score.*\)',
@@ -84,29 +71,15 @@ class ImprovedOutputMisinterpreterConfig:
                         r'azure-ai-textanalytics',
                         r'azure\.cognitiveservices'
                     ],
-                    'api_call_patterns': [
-                        r'analyze_sentiment\s*\(',
-                        r'\.analyze_sentiment\s*\(',
-                        r'client\.analyze_sentiment',
-                        r'text_client\.analyze_sentiment',
-                        r'begin_analyze_sentiment'
-                    ],
-                    'result_field_patterns': {
-                        'sentiment': [
-                            r'\.sentiment\b',
-                            r'result\.sentiment',
-                            r'response\.sentiment',
-                            r'\[[\"\']sentiment[\"\']\]',
-                            r'getattr\(.*,\s*["\']sentiment["\']'
-                        ],
-                        'confidence_scores': [
-                            r'\.confidence_scores\b',
-                            r'confidence_score',
-                            r'result\.confidence_scores',
-                            r'response\.confidence_scores',
-                            r'\[[\"\']confidence_scores[\"\']\]'
-                        ]
+                    'api_call_names': ['analyze_sentiment'],  # Also matches begin_analyze_sentiment
+                    'result_fields': {
+                        'sentiment': {'names': ['sentiment']},
+                        'confidence_scores': {'names': ['confidence_scores'], 'fragments': ['confidence_score']}
                     },
+                    'correct_usage_terms': [('sentiment', 'confidence'), ('confidence_scores',)],
+                    'misuse_comparisons': [
+                        {'operand_suffix': 'sentiment', 'ops': ['==', '!='], 'against': 'any'}
+                    ],
                     'correct_usage_patterns': [
                         r'sentiment.*confidence',
                         r'confidence.*sentiment',
@@ -133,29 +106,15 @@ class ImprovedOutputMisinterpreterConfig:
                         r'from\s+boto3',
                         r'aws.*comprehend'
                     ],
-                    'api_call_patterns': [
-                        r'detect_sentiment\s*\(',
-                        r'\.detect_sentiment\s*\(',
-                        r'client\.detect_sentiment',
-                        r'comprehend\.detect_sentiment',
-                        r'batch_detect_sentiment'
-                    ],
-                    'result_field_patterns': {
-                        'Sentiment': [
-                            r'\.Sentiment\b',
-                            r'result\.Sentiment',
-                            r'response\.Sentiment',
-                            r'\[[\"\']Sentiment[\"\']\]',
-                            r'\.get\(\s*["\']Sentiment["\']'
-                        ],
-                        'SentimentScore': [
-                            r'\.SentimentScore\b',
-                            r'result\.SentimentScore',
-                            r'response\.SentimentScore',
-                            r'\[[\"\']SentimentScore[\"\']\]',
-                            r'\.get\(\s*["\']SentimentScore["\']'
-                        ]
+                    'api_call_names': ['detect_sentiment'],  # Also matches batch_detect_sentiment
+                    'result_fields': {
+                        'Sentiment': {'names': ['Sentiment']},
+                        'SentimentScore': {'names': ['SentimentScore']}
                     },
+                    'correct_usage_terms': [('sentiment', 'sentimentscore')],
+                    'misuse_comparisons': [
+                        {'operand_suffix': 'sentiment', 'ops': ['==', '!='], 'against': 'any'}
+                    ],
                     'correct_usage_patterns': [
                         r'Sentiment.*SentimentScore',
                         r'SentimentScore.*Sentiment',
@@ -175,13 +134,142 @@ class ImprovedOutputMisinterpreterConfig:
         }
 
 
-class ImprovedOutputMisinterpreterVisitor(ast.NodeVisitor):
+COMPARISON_OPERATORS = {'<': ast.Lt, '>': ast.Gt, '<=': ast.LtE, '>=': ast.GtE, '==': ast.Eq, '!=': ast.NotEq}
+
+
+def node_name(node):
+    """Identifier a Name or Attribute node ends with, else None."""
+    if isinstance(node, ast.Name):
+        return node.id
+    if isinstance(node, ast.Attribute):
+        return node.attr
+    return None
+
+
+def is_number(node):
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd)):
+        node = node.operand
+    return isinstance(node, ast.Constant) and isinstance(node.value, (int, float)) and not isinstance(node.value, bool)
+
+
+def field_accessed(node):
+    """Name of the field read by x.field, x["field"], x.get("field") or getattr(x, "field"), else None."""
+    if isinstance(node, ast.Attribute):
+        return node.attr
+    if isinstance(node, ast.Subscript):
+        key = node.slice
+        return key.value if isinstance(key, ast.Constant) and isinstance(key.value, str) else None
+    if isinstance(node, ast.Call) and node.args:
+        if isinstance(node.func, ast.Attribute) and node.func.attr == 'get':
+            key = node.args[0]
+        elif isinstance(node.func, ast.Name) and node.func.id == 'getattr' and len(node.args) > 1:
+            key = node.args[1]
+        else:
+            return None
+        return key.value if isinstance(key, ast.Constant) and isinstance(key.value, str) else None
+    return None
+
+
+class SentimentAPIRules:
+    """Structural matchers for one provider's sentiment API, compiled once from its configuration."""
+
+    def __init__(self, config):
+        self.import_re = re.compile('|'.join(config['import_indicators']), re.IGNORECASE)
+        self.call_names = tuple(name.lower() for name in config['api_call_names'])
+        self.fields = [
+            (frozenset(name.lower() for name in field['names']), tuple(field.get('fragments', ())))
+            for field in config['result_fields'].values()
+        ]
+        self.correct_usage_terms = config['correct_usage_terms']
+        self.abs_terms = tuple(config.get('abs_terms', ()))
+        self.misuse_comparisons = [
+            (rule['operand_suffix'], tuple(COMPARISON_OPERATORS[op] for op in rule['ops']), rule['against'])
+            for rule in config['misuse_comparisons']
+        ]
+        self.correct_usage_patterns = config['correct_usage_patterns']
+        self.misuse_patterns = config['misuse_patterns']
+        # Both pattern lists are matched over the file text in a single scan
+        self.text_scanner = LineScanner(self.correct_usage_patterns + self.misuse_patterns, re.IGNORECASE)
+
+    def is_api_call(self, node):
+        """True for a call to the sentiment API, e.g. client.analyze_sentiment(...)."""
+        if isinstance(node, ast.Await):
+            node = node.value
+        if not isinstance(node, ast.Call):
+            return False
+        name = node_name(node.func)
+        return name is not None and any(call_name in name.lower() for call_name in self.call_names)
+
+    def field_index(self, node):
+        """0 for the primary result field, 1 for the secondary one, None otherwise."""
+        field = field_accessed(node)
+        if field is None:
+            return None
+        field = field.lower()
+        for i, (names, fragments) in enumerate(self.fields):
+            if field in names or any(fragment in field for fragment in fragments):
+                return i
+        return None
+
+    def is_correct_usage(self, condition):
+        """A condition that weighs the result fields together (e.g. score and magnitude)."""
+        mentions = condition_mentions(condition)
+        for terms in self.correct_usage_terms:
+            matched = [{i for i, mention in enumerate(mentions) if term in mention} for term in terms]
+            if all(matched) and len(set().union(*matched)) >= len(terms):
+                return True
+        if self.abs_terms:
+            for node in ast.walk(condition):
+                if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id == 'abs':
+                    inner = [mention for arg in node.args for mention in condition_mentions(arg)]
+                    if any(term in mention for term in self.abs_terms for mention in inner):
+                        return True
+        return False
+
+    def misuse_in(self, condition):
+        """Return the misuse comparison (operand_suffix, ops, against) the condition makes, or None."""
+        for node in ast.walk(condition):
+            if not isinstance(node, ast.Compare):
+                continue
+            operands = [node.left] + node.comparators
+            for op, left, right in zip(node.ops, operands, operands[1:]):
+                name = node_name(left) or field_accessed(left)
+                if name is None:
+                    continue
+                for rule in self.misuse_comparisons:
+                    suffix, ops, against = rule
+                    if name.lower().endswith(suffix) and isinstance(op, ops) and (against == 'any' or is_number(right)):
+                        return rule
+        return None
+
+
+def condition_mentions(node):
+    """Lower-cased identifiers, attribute names and string constants appearing in an expression."""
+    mentions = []
+    for child in ast.walk(node):
+        if isinstance(child, ast.Name):
+            mentions.append(child.id.lower())
+        elif isinstance(child, ast.Attribute):
+            mentions.append(child.attr.lower())
+        elif isinstance(child, ast.Constant) and isinstance(child.value, str):
+            mentions.append(child.value.lower())
+    return mentions
+
+
+# Built once when the module is loaded and shared by every visitor
+SENTIMENT_RULES = {
+    provider: SentimentAPIRules(patterns['sentiment_analysis'])
+    for provider, patterns in ImprovedOutputMisinterpreterConfig().api_patterns.items()
+}
+
+
+class ImprovedOutputMisinterpreterVisitor(Rule):
     """Enhanced visitor for better sentiment API misuse detection"""
    
-    def __init__(self, file_path, cloud_provider):
+    def __init__(self, file_path, cloud_provider, index=None):
         self.file_path = file_path
+        self.index = index
         self.cloud_provider = cloud_provider
-        self.config = ImprovedOutputMisinterpreterConfig()
         self.misuses = []
        
         # Detection state
@@ -192,195 +280,134 @@ class ImprovedOutputMisinterpreterVisitor(ast.NodeVisitor):
         self.has_correct_usage = False
         self.detected_misuse_patterns = []
        
-        # Get provider config
-        self.provider_config = self.get_provider_config()
-       
-    def get_provider_config(self):
-        """Get configuration for detected cloud provider"""
-        if self.cloud_provider in self.config.api_patterns:
-            return self.config.api_patterns[self.cloud_provider]['sentiment_analysis']
-        return None
-   
+        # Get provider rules
+        self.rules = SENTIMENT_RULES.get(cloud_provider)
+
+    def visit(self, tree):
+        if self.rules is not None:  # Nothing to match for unknown providers
+            super().visit(tree)
+
     def visit_Import(self, node):
         """Check for sentiment API imports"""
-        if not self.provider_config:
-            return
-           
-        for alias in node.names:
-            import_name = alias.name
-            for pattern in self.provider_config['import_indicators']:
-                if re.search(pattern, import_name, re.IGNORECASE):
-                    self.has_sentiment_import = True
-                    break
-       
-        self.generic_visit(node)
+        if any(self.rules.import_re.search(f"import {alias.name}") for alias in node.names):
+            self.has_sentiment_import = True
    
     def visit_ImportFrom(self, node):
         """Check for sentiment API imports with from statement"""
-        if not self.provider_config:
-            return
-           
         if node.module:
-            full_import = f"from {node.module} import"
-            for pattern in self.provider_config['import_indicators']:
-                if re.search(pattern, full_import, re.IGNORECASE):
-                    self.has_sentiment_import = True
-                    break
-       
-        self.generic_visit(node)
+            statements = [f"from {node.module} import {alias.name}" for alias in node.names]
+            if any(self.rules.import_re.search(statement) for statement in statements):
+                self.has_sentiment_import = True
    
     def visit_Call(self, node):
-        """Check for sentiment API calls"""
-        if not self.provider_config:
-            return
-           
-        call_str = self.get_call_string(node)
-        if call_str:
-            for pattern in self.provider_config['api_call_patterns']:
-                if re.search(pattern, call_str, re.IGNORECASE):
-                    self.has_sentiment_api_call = True
-                    break
-       
-        self.generic_visit(node)
+        """Check for sentiment API calls and result fields read through get()/getattr()"""
+        if self.rules.is_api_call(node):
+            self.has_sentiment_api_call = True
+        self.record_field_usage(node)
    
     def visit_Assign(self, node):
-        """Track API result variable assignments"""
-        if not self.provider_config:
-            return
-           
-        # Check if this is assigning a sentiment API result
-        if isinstance(node.value, ast.Call):
-            call_str = self.get_call_string(node.value)
-            if call_str:
-                for pattern in self.provider_config['api_call_patterns']:
-                    if re.search(pattern, call_str, re.IGNORECASE):
-                        # Store the variable that will hold the result
-                        if isinstance(node.targets[0], ast.Name):
-                            self.api_result_variables.add(node.targets[0].id)
-                        break
-       
-        self.generic_visit(node)
+        """Track API result variables, and the variables derived from them"""
+        if self.rules.is_api_call(node.value) or self.is_api_result(node.value):
+            for target in node.targets:
+                self.bind_result(target)
+
+    def visit_For(self, node):
+        """Loop variables over an API result (e.g. for doc in result.documents) hold results too"""
+        if self.is_api_result(node.iter):
+            self.bind_result(node.target)
+
+    def is_api_result(self, node):
+        """True if node reads a tracked result: result, result.x, result["x"], result.get("x") and chains of them."""
+        while True:
+            if isinstance(node, ast.Name):
+                return node.id in self.api_result_variables
+            if isinstance(node, (ast.Attribute, ast.Subscript)):
+                node = node.value
+            elif isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and node.func.attr == 'get':
+                node = node.func.value
+            else:
+                return False
+
+    def bind_result(self, target):
+        # Store the variable(s) that will hold the result
+        if isinstance(target, ast.Name):
+            self.api_result_variables.add(target.id)
+        elif isinstance(target, (ast.Tuple, ast.List)):
+            for element in target.elts:
+                self.bind_result(element)
    
     def visit_If(self, node):
         """Analyze if statements for misuse patterns"""
-        if not self.provider_config:
-            return
-           
-        condition_str = self.get_node_string(node.test)
-        if condition_str:
-            self.analyze_condition_for_misuse(condition_str, node.lineno)
-       
-        self.generic_visit(node)
+        self.analyze_condition_for_misuse(node.test, node.lineno)
    
     def visit_While(self, node):
         """Analyze while statements for misuse patterns"""
-        if not self.provider_config:
-            return
-           
-        condition_str = self.get_node_string(node.test)
-        if condition_str:
-            self.analyze_condition_for_misuse(condition_str, node.lineno)
-       
-        self.generic_visit(node)
+        self.analyze_condition_for_misuse(node.test, node.lineno)
    
     def visit_Attribute(self, node):
         """Check for field access patterns"""
-        if not self.provider_config:
-            return
-           
-        attr_str = self.get_node_string(node)
-        if attr_str:
-            # Check for primary field usage (score/sentiment)
-            primary_field = list(self.provider_config['result_field_patterns'].keys())[0]
-            for pattern in self.provider_config['result_field_patterns'][primary_field]:
-                if re.search(pattern, attr_str, re.IGNORECASE):
-                    self.field_usage['primary'] = True
-                    break
-           
-            # Check for secondary field usage (magnitude/confidence)
-            if len(self.provider_config['result_field_patterns']) > 1:
-                secondary_field = list(self.provider_config['result_field_patterns'].keys())[1]
-                for pattern in self.provider_config['result_field_patterns'][secondary_field]:
-                    if re.search(pattern, attr_str, re.IGNORECASE):
-                        self.field_usage['secondary'] = True
-                        break
-       
-        self.generic_visit(node)
-   
-    def get_call_string(self, node):
-        """Get string representation of function call"""
-        try:
-            if hasattr(ast, 'unparse'):
-                return ast.unparse(node)
-            else:
-                # Fallback for older Python versions
-                if isinstance(node.func, ast.Attribute):
-                    return f"{node.func.attr}()"
-                elif isinstance(node.func, ast.Name):
-                    return f"{node.func.id}()"
-        except:
-            pass
-        return None
-   
-    def get_node_string(self, node):
-        """Get string representation of AST node"""
-        try:
-            if hasattr(ast, 'unparse'):
-                return ast.unparse(node)
-            else:
-                # Fallback - limited functionality
-                return str(node)
-        except:
-            return None
+        self.record_field_usage(node)
+
+    def visit_Subscript(self, node):
+        self.record_field_usage(node)
+
+    def record_field_usage(self, node):
+        # Primary field (score/sentiment) or secondary field (magnitude/confidence)
+        field = self.rules.field_index(node)
+        if field == 0:
+            self.field_usage['primary'] = True
+        elif field == 1:
+            self.field_usage['secondary'] = True
    
-    def analyze_condition_for_misuse(self, condition_str, line_number):
+    def location(self, lineno):
+        if self.index is not None:
+            return self.index.location(self.file_path, lineno)
+        return f"line {lineno} of {self.file_path}"
+
+    def analyze_condition_for_misuse(self, condition, line_number):
         """Analyze condition for sentiment API misuse patterns"""
         # First check if this condition involves our API result variables
-        involves_api_result = any(var in condition_str for var in self.api_result_variables)
+        involves_api_result = any(
+            isinstance(node, ast.Name) and node.id in self.api_result_variables for node in ast.walk(condition)
+        )
        
         if not involves_api_result:
             return
        
         # Check for correct usage patterns first
-        for pattern in self.provider_config.get('correct_usage_patterns', []):
-            if re.search(pattern, condition_str, re.IGNORECASE):
-                self.has_correct_usage = True
-                return
+        if self.rules.is_correct_usage(condition):
+            self.has_correct_usage = True
+            return
        
-        # Check for misuse patterns
-        for pattern in self.provider_config.get('misuse_patterns', []):
-            if re.search(pattern, condition_str, re.IGNORECASE):
-                self.detected_misuse_patterns.append({
-                    'pattern': pattern,
-                    'line': line_number,
-                    'condition': condition_str
-                })
-                break
+        # Check for misuse patterns; the condition is only rendered for a finding
+        rule = self.rules.misuse_in(condition)
+        if rule is not None:
+            suffix, ops, against = rule
+            self.detected_misuse_patterns.append({
+                'pattern': f"{suffix} compared with {'a number' if against == 'number' else 'a value'}",
+                'line': self.location(line_number),
+                'condition': ast.unparse(condition)
+            })
    
     def analyze_file_content(self, file_content):
         """Analyze entire file content for additional patterns"""
-        if not self.provider_config:
+        if self.rules is None:
             return
+        first_lines = self.rules.text_scanner.first_lines(file_content)
        
         # Check for correct usage patterns in entire file
-        for pattern in self.provider_config.get('correct_usage_patterns', []):
-            if re.search(pattern, file_content, re.IGNORECASE):
-                self.has_correct_usage = True
-                break
+        if any(pattern in first_lines for pattern in self.rules.correct_usage_patterns):
+            self.has_correct_usage = True
        
-        # Check for misuse patterns in entire file
-        for pattern in self.provider_config.get('misuse_patterns', []):
-            if re.search(pattern, file_content, re.IGNORECASE):
-                # Find line number
-                lines = file_content.split('\n')
-                for i, line in enumerate(lines, 1):
-                    if re.search(pattern, line, re.IGNORECASE):
-                        self.detected_misuse_patterns.append({
-                            'pattern': pattern,
-                            'line': i,
-                            'condition': line.strip()
-                        })
-                        break
+        # Check for misuse patterns in entire file, reporting the first line of each
+        for pattern in self.rules.misuse_patterns:
+            if pattern in first_lines:
+                line_number, line = first_lines[pattern]
+                self.detected_misuse_patterns.append({
+                    'pattern': pattern,
+                    'line': self.location(line_number),
+                    'condition': line.strip()
+                })
    
     def determine_final_result(self):
         """Determine if there is a misuse based on all evidence"""
@@ -398,7 +425,8 @@ class ImprovedOutputMisinterpreterVisitor(ast.NodeVisitor):
        
         # If misuse patterns are detected, it's a misuse
         if self.detected_misuse_patterns:
-            return True, f"Misuse patterns detected: {len(self.detected_misuse_patterns)} instances"
+            return True, (f"Misuse patterns detected: {len(self.detected_misuse_patterns)} instances, "
+                          f"first at {self.detected_misuse_patterns[0]['line']}")
        
         # If only primary field used without secondary, likely misuse
         if self.field_usage['primary'] and not self.field_usage['secondary']:
@@ -411,34 +439,51 @@ class ImprovedOutputMisinterpreterVisitor(ast.NodeVisitor):
         return False, "Insufficient evidence for misuse"
 
 
-def analyze_output_misinterpretation_in_repo(trees):
-    """Analyze output misinterpretation across repository files"""
+def analyze_output_misinterpretation_in_file(file_path, tree, source_code=None, index=None):
+    """
+    Analyze one file; returns (is_misuse, reason), or None when the file has no
+    supported provider. Depends only on the file, so files can be analyzed
+    independently and their verdicts cached. Lines are reported through the
+    RepoIndex when given, so notebook findings name the cell.
+    """
+    # Detect cloud provider for this file
+    cloud_provider = detect_cloud_provider(tree)
+    if cloud_provider not in SENTIMENT_RULES:
+        return None
+       
+    print(f"Processing file: {file_path} (Provider: {cloud_provider})")
+   
+    # Create visitor and analyze
+    visitor = ImprovedOutputMisinterpreterVisitor(file_path, cloud_provider, index)
+    visitor.visit(tree)
+   
+    # Also analyze file content for additional patterns
+    if source_code is not None:
+        visitor.analyze_file_content(source_code)
+   
+    # Determine result
+    return visitor.determine_final_result()
+
+
+def analyze_output_misinterpretation_in_repo(trees, sources=None, index=None):
+    """Analyze output misinterpretation across repository files and combine the per-file verdicts"""
     total_misuse_count = 0
     all_misuses = []
    
     for file_path, tree in trees:
-        # Detect cloud provider for this file
-        cloud_provider = detect_cloud_provider(tree)
-       
-        if not cloud_provider:
+        # File text comes from the sources already read for parsing, when available
+        if sources is not None:
+            source_code = sources.get(file_path)
+        else:
+            try:
+                source_code = read_source(file_path)
+            except (OSError, UnicodeDecodeError, ValueError):
+                source_code = None
+
+        verdict = analyze_output_misinterpretation_in_file(file_path, tree, source_code, index)
+        if verdict is None:
             continue
-           
-        print(f"Processing file: {file_path} (Provider: {cloud_provider})")
-       
-        # Create visitor and analyze
-        visitor = ImprovedOutputMisinterpreterVisitor(file_path, cloud_provider)
-        visitor.visit(tree)
-       
-        # Also analyze file content for additional patterns
-        try:
-            with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                file_content = f.read()
-                visitor.analyze_file_content(file_content)
-        except:
-            pass
-       
-        # Determine result
-        is_misuse, reason = visitor.determine_final_result()
+        is_misuse, reason = verdict
        
         if is_misuse:
             misuse_message = f"Output misinterpretation in {file_path}: {reason}"
@@ -452,18 +497,9 @@ def analyze_output_misinterpretation_in_repo(trees):
     return total_misuse_count, all_misuses
 
 
-def detect_output_misinterpretation(tree):
-    """
-    CORRECTED: This function now accepts a single tree (combined AST)
-    and creates the trees structure internally to match other detectors.
-    """
-    # For consistency with other detectors, we need to handle the case
-    # where we get a single combined tree instead of a list of (file_path, tree) tuples
-    
-    # Create a pseudo-trees structure for compatibility
-    trees = [("combined_repo", tree)]
-    
-    misuse_count, misuses = analyze_output_misinterpretation_in_repo(trees)
+def detect_output_misinterpretation(index):
+    """Analyze every file of the repository index and report the files with a misuse."""
+    misuse_count, misuses = analyze_output_misinterpretation_in_repo(index.trees, index.sources, index)
    
     # Return in standardized MLMisfinder format
     return {
@@ -472,6 +508,6 @@ def detect_output_misinterpretation(tree):
     }
 
 
-def detect(repo_path):
-    """Standard MLMisfinder entry point"""
-    return process_repos([repo_path], detect_output_misinterpretation)
\ No newline at end of file
+def detect(repo):
+    """Standard MLMisfinder entry point (repository path or prebuilt RepoIndex)"""
+    return process_repos([repo], detect_output_misinterpretation)
\ No newline at end of file
@@ -0,0 +1,226 @@
+import ast
+import heapq
+import weakref
+from array import array
+from collections import namedtuple
+
+# Lexical context of a node: the enclosing loops (outermost first, across function
+# boundaries) and the nearest enclosing function definition, or None at module level
+NodeContext = namedtuple("NodeContext", "loops function")
+MODULE_CONTEXT = NodeContext((), None)
+
+LOOP_TYPES = (ast.For, ast.AsyncFor, ast.While)
+FUNCTION_TYPES = (ast.FunctionDef, ast.AsyncFunctionDef)
+# Operator and expression-context nodes carry no information any detector uses
+IGNORED_TYPES = (ast.expr_context, ast.boolop, ast.operator, ast.unaryop, ast.cmpop)
+
+# Returned by a handler to skip the descendants of the node for the rule that owns it
+PRUNE = object()
+# Returned by a handler once its rule has reached a verdict: the rule sees no more nodes
+STOP = object()
+
+
+class NodeTable:
+    """
+    Flat preorder listing of a tree, built by one iterative traversal.
+
+    nodes[i], contexts[i] and ends[i] describe the i-th node in preorder; ends[i] is
+    the index of its last descendant, so the subtree of node i is nodes[i:ends[i] + 1].
+    parents[i], loops[i] and functions[i] hold the index of the parent, of the
+    nearest enclosing loop and of the nearest enclosing function (-1 if none), and
+    positions maps id(node) back to i, so those queries are O(1) and the tree is
+    never annotated. by_type maps each node type to the indexes of its nodes, so
+    rules only ever see the node types they handle. The traversal uses an explicit
+    stack and cannot hit the recursion limit on deeply nested code.
+    """
+
+    def __init__(self, tree):
+        self.nodes = []
+        self.contexts = []
+        self.ends = []
+        self.parents = array("l")
+        self.loops = array("l")
+        self.functions = array("l")
+        self.positions = {}
+        self.by_type = {}
+
+        # Entries are (node, context, parent, loop, function); node None marks the end of a subtree
+        stack = [(tree, MODULE_CONTEXT, -1, -1, -1)]
+        while stack:
+            node, context, parent, loop, function = stack.pop()
+            if node is None:
+                self.ends[parent] = len(self.nodes) - 1
+                continue
+            index = len(self.nodes)
+            self.nodes.append(node)
+            self.contexts.append(context)
+            self.ends.append(index)
+            self.parents.append(parent)
+            self.loops.append(loop)
+            self.functions.append(function)
+            self.positions[id(node)] = index
+            self.by_type.setdefault(type(node), []).append(index)
+
+            if isinstance(node, LOOP_TYPES):
+                context = NodeContext(context.loops + (node,), context.function)
+                loop = index
+            elif isinstance(node, FUNCTION_TYPES):
+                context = NodeContext(context.loops, node)
+                function = index
+            children = [child for child in ast.iter_child_nodes(node) if not isinstance(child, IGNORED_TYPES)]
+            if children:
+                stack.append((None, None, index, None, None))
+                stack.extend((child, context, index, loop, function) for child in reversed(children))
+
+    def _node(self, index):
+        return self.nodes[index] if index >= 0 else None
+
+    def parent(self, node):
+        return self._node(self.parents[self.positions[id(node)]])
+
+    def enclosing_loop(self, node):
+        """Nearest For/AsyncFor/While strictly above node, across function boundaries."""
+        return self._node(self.loops[self.positions[id(node)]])
+
+    def enclosing_function(self, node):
+        """Nearest FunctionDef/AsyncFunctionDef strictly above node."""
+        return self._node(self.functions[self.positions[id(node)]])
+
+
+# Tables are memoized per tree so that every rule engine run on a tree shares one traversal
+NODE_TABLES = weakref.WeakKeyDictionary()
+
+
+def node_tables(tree):
+    """Return the NodeTables covering a tree: one per file for a combined repository module."""
+    tables = NODE_TABLES.get(tree)
+    if tables is None:
+        tables = NODE_TABLES[tree] = [NodeTable(tree)]
+    return tables
+
+
+def register_combined_tree(combined_tree, trees):
+    """Let a combined module reuse the tables of the files it was built from."""
+    NODE_TABLES[combined_tree] = [table for tree in trees for table in node_tables(tree)]
+
+
+class ParentIndex:
+    """
+    Side-table parent / enclosing-loop / enclosing-function lookups for a tree.
+
+    Built from the tree's shared NodeTables, so it costs no extra traversal and
+    never sets attributes on the nodes. Works for combined repository modules too.
+    """
+
+    def __init__(self, tree):
+        self.tables = node_tables(tree)
+        self.table_of = None
+        if len(self.tables) > 1:
+            self.table_of = {key: table for table in self.tables for key in table.positions}
+
+    def _table(self, node):
+        return self.tables[0] if self.table_of is None else self.table_of[id(node)]
+
+    def parent(self, node):
+        return self._table(node).parent(node)
+
+    def enclosing_loop(self, node):
+        return self._table(node).enclosing_loop(node)
+
+    def enclosing_function(self, node):
+        return self._table(node).enclosing_function(node)
+
+    def module(self, node):
+        """Root of the file a node belongs to: the tree itself, or a file's module within a combined tree."""
+        return self._table(node).nodes[0]
+
+
+class RuleEngine:
+    """
+    Dispatches the nodes of a tree to handlers registered per node type.
+
+    Handlers are called in preorder, like ast.NodeVisitor, but the traversal is the
+    tree's shared NodeTable, so running several rules (or several engines) on the
+    same tree walks it only once. A handler may return PRUNE to skip the subtree of
+    the node for its owner, or STOP to end the run for its owner; dispatch ends as
+    soon as every owner has stopped. Before each call the owner's `context`
+    attribute is set to the NodeContext of the node.
+    """
+
+    def __init__(self, rules=()):
+        self.handlers = {}  # node type -> [(owner, handler)]
+        self.stopped = set()  # ids of the owners that returned STOP
+        for rule in rules:
+            self.add_rule(rule)
+
+    def register(self, node_type, handler, owner=None):
+        self.handlers.setdefault(node_type, []).append((owner, handler))
+
+    def add_rule(self, rule):
+        """
+        Register every visit_<NodeType> method of a rule object. Only methods
+        defined by the rule's own classes count: the ones ast.NodeVisitor provides
+        (visit_Constant, ...) are generic fallbacks, not rules.
+        """
+        names = set()
+        for cls in type(rule).__mro__:
+            if cls is not ast.NodeVisitor and cls is not object:
+                names.update(vars(cls))
+        for name in sorted(names):
+            node_type = getattr(ast, name[6:], None) if name.startswith("visit_") else None
+            if isinstance(node_type, type) and issubclass(node_type, ast.AST):
+                self.register(node_type, getattr(rule, name), rule)
+
+    def _all_stopped(self):
+        owners = {id(owner) for handlers in self.handlers.values() for owner, _ in handlers}
+        return owners <= self.stopped
+
+    def run(self, tree):
+        for table in node_tables(tree):
+            self._dispatch(table)
+            if self.stopped and self._all_stopped():
+                return
+
+    def _dispatch(self, table):
+        indexes = [table.by_type[node_type] for node_type in self.handlers if node_type in table.by_type]
+        if not indexes:
+            return
+        ordered = indexes[0] if len(indexes) == 1 else heapq.merge(*indexes)
+        pruned_until = {}  # owner -> last index of the subtree it asked to skip
+        for index in ordered:
+            node = table.nodes[index]
+            for owner, handler in self.handlers[type(node)]:
+                if pruned_until.get(id(owner), -1) >= index or id(owner) in self.stopped:
+                    continue
+                if owner is not None:
+                    owner.context = table.contexts[index]
+                result = handler(node)
+                if result is PRUNE:
+                    pruned_until[id(owner)] = table.ends[index]
+                elif result is STOP:
+                    self.stopped.add(id(owner))
+                    if self._all_stopped():
+                        return
+
+
+class Rule(ast.NodeVisitor):
+    """
+    Base class for visitors driven by a RuleEngine.
+
+    Subclasses keep the ast.NodeVisitor visit_<NodeType> style. The engine does the
+    traversal, so generic_visit is a no-op; to skip a subtree, return PRUNE, and to
+    stop visiting altogether, return STOP.
+    """
+
+    context = MODULE_CONTEXT
+
+    def generic_visit(self, node):
+        pass
+
+    def visit(self, tree):
+        RuleEngine([self]).run(tree)
+
+
+def run_rules(tree, rules):
+    """Run several rules over a tree in a single dispatch."""
+    RuleEngine(rules).run(tree)
@@ -0,0 +1,104 @@
+import io
+import subprocess
+
+
+def git(repo_path, *args, stdin=None):
+    """Run a git command on a repository (bare or not) and return its stdout as bytes."""
+    result = subprocess.run(["git", "-C", repo_path, *args], input=stdin, stdout=subprocess.PIPE,
+                            stderr=subprocess.PIPE, check=False)
+    if result.returncode != 0:
+        raise RuntimeError(f"git {args[0]} failed in {repo_path}: {result.stderr.decode(errors='replace').strip()}")
+    return result.stdout
+
+
+def resolve_commit(repo_path, revision="HEAD"):
+    """Full SHA of the commit a revision (branch, tag, SHA, HEAD~3, ...) points to."""
+    return git(repo_path, "rev-parse", "--verify", "--end-of-options", f"{revision}^{{commit}}").decode().strip()
+
+
+class GitObjectReader:
+    """
+    Reads objects from a repository's object database through one long-lived
+    `git cat-file --batch` process, so reading many blobs costs a pipe round trip
+    each instead of a process start. Use as a context manager, or call close().
+    """
+
+    def __init__(self, repo_path):
+        self.repo_path = repo_path
+        self.process = subprocess.Popen(["git", "-C", repo_path, "cat-file", "--batch"],
+                                        stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+
+    def read(self, object_name, max_size=None):
+        """
+        Return (object_type, data) for an object, or (object_type, None) when it is
+        larger than max_size; its content is then discarded without being kept.
+        """
+        self.process.stdin.write(object_name.encode() + b"\n")
+        self.process.stdin.flush()
+        header = self.process.stdout.readline()
+        if not header or header.endswith(b" missing\n"):
+            raise KeyError(f"{object_name} is not in {self.repo_path}")
+        _, object_type, size = header.split()
+        size = int(size)
+        if max_size is not None and size > max_size:
+            remaining = size
+            while remaining:
+                remaining -= len(self.process.stdout.read(min(remaining, 1 << 20)))
+            data = None
+        else:
+            data = self.process.stdout.read(size)
+        self.process.stdout.read(1)  # Newline ending every object
+        return object_type.decode(), data
+
+    def close(self):
+        if self.process.poll() is None:
+            self.process.stdin.close()
+            self.process.wait()
+        self.process.stdout.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def list_tree(repo_path, commit):
+    """Yield (path, blob_sha) for every regular file of a commit; symlinks and submodules are left out."""
+    for entry in git(repo_path, "ls-tree", "-r", "-z", "--full-tree", commit).split(b"\0"):
+        if not entry:
+            continue
+        info, path = entry.split(b"\t", 1)
+        mode, object_type, sha = info.split()
+        if object_type == b"blob" and mode in (b"100644", b"100755"):
+            yield path.decode("utf-8", "surrogateescape"), sha.decode()
+
+
+def promisor_remote(repo_path):
+    """Name of the remote a partial clone lazily fetches missing objects from, or None for a full clone."""
+    result = subprocess.run(["git", "-C", repo_path, "config", "--get-regexp", r"^remote\..*\.promisor$", "true"],
+                            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, check=False)
+    lines = result.stdout.decode().split()
+    return lines[0][len("remote."):-len(".promisor")] if lines else None
+
+
+def prefetch_blobs(repo_path, commit, blob_shas):
+    """
+    In a partial clone, download the given blobs of a commit that are still missing
+    with a single fetch; cat-file would otherwise fetch them one request at a time.
+    """
+    remote = promisor_remote(repo_path)
+    if remote is None:
+        return
+    wanted = set(blob_shas)
+    listing = git(repo_path, "rev-list", "--objects", "--no-walk", "--missing=print", commit)
+    missing = [line[1:] for line in listing.decode().splitlines() if line.startswith("?") and line[1:] in wanted]
+    if missing:
+        git(repo_path, "-c", "fetch.negotiationAlgorithm=noop", "fetch", "--quiet", remote, "--no-tags",
+            "--no-write-fetch-head", "--recurse-submodules=no", "--filter=blob:none", "--stdin",
+            stdin="\n".join(missing).encode() + b"\n")
+
+
+def text_stream(data):
+    """Text view of blob content, decoded like open(path, "r", encoding="utf-8") reads a file, newlines included."""
+    return io.TextIOWrapper(io.BytesIO(data), encoding="utf-8")
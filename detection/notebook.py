@@ -0,0 +1,296 @@
+import re
+import json
+
+# Cell magics whose body is still Python; any other %%magic (bash, html, ...) hides the whole cell
+PYTHON_CELL_MAGICS = {"time", "timeit", "capture", "prun", "debug", "writefile"}
+
+# Line magics, shell escapes (optionally assigned, e.g. "files = !ls") and help requests ("obj?", "?obj")
+MAGIC_LINE = re.compile(r"^(\s*)(?:(?:[\w.,\s]+=\s*)?[%!]|\?|[\w.]+\?\??\s*$)")
+
+STRING_BODY = re.compile(r'[^"\\]*(?:\\.[^"\\]*)*', re.S)
+STRUCTURAL = re.compile(r'["\[\]{}]')
+SCALAR = re.compile(r"[^,\]}\s]+")
+
+
+class NotebookReader:
+    """
+    Minimal streaming JSON reader for .ipynb files.
+
+    The file is read in chunks and consumed text is dropped, so values that are
+    skipped (cell outputs, attachments, metadata) are scanned with regex jumps but
+    never decoded or held in memory as a whole. Only the values the caller asks
+    for, such as cell sources, are decoded.
+    """
+
+    CHUNK_SIZE = 1 << 16
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.buf = ""
+        self.pos = 0
+
+    def _fill(self):
+        """Drop consumed text and append the next chunk; return False at end of file."""
+        chunk = self.stream.read(self.CHUNK_SIZE)
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return bool(chunk)
+
+    def peek(self):
+        """Return the next non-whitespace character without consuming it ("" at end of file)."""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in " \t\r\n":
+                self.pos += 1
+            if self.pos < len(self.buf) or not self._fill():
+                return self.buf[self.pos:self.pos + 1]
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError(f"Malformed notebook: expected {char!r} at {self.buf[self.pos:self.pos + 20]!r}")
+        self.pos += 1
+
+    def _string_end(self):
+        """Index just past the closing quote of the string starting at self.pos, or None if not buffered yet."""
+        end = STRING_BODY.match(self.buf, self.pos + 1).end()
+        if end < len(self.buf) and self.buf[end] == '"':
+            return end + 1
+        return None
+
+    def read_string(self):
+        self.peek()
+        while True:
+            end = self._string_end()
+            if end is not None:
+                value = json.loads(self.buf[self.pos:end])
+                self.pos = end
+                return value
+            if not self._fill():
+                raise ValueError("Malformed notebook: unterminated string")
+
+    def skip_string(self):
+        self.peek()
+        self.pos += 1
+        while True:
+            end = STRING_BODY.match(self.buf, self.pos).end()
+            if end < len(self.buf) and self.buf[end] == '"':
+                self.pos = end + 1
+                return
+            self.pos = end  # Keep only a dangling escape, if any
+            if not self._fill():
+                raise ValueError("Malformed notebook: unterminated string")
+
+    def skip_value(self):
+        char = self.peek()
+        if char == '"':
+            return self.skip_string()
+        if char not in "[{":
+            while True:
+                end = SCALAR.match(self.buf, self.pos).end()
+                if end < len(self.buf) or not self._fill():
+                    self.pos = end
+                    return
+        depth = 0
+        while True:
+            match = STRUCTURAL.search(self.buf, self.pos)
+            if match is None:
+                self.pos = len(self.buf)
+                if not self._fill():
+                    raise ValueError("Malformed notebook: unterminated container")
+                continue
+            self.pos = match.start()
+            if match.group() == '"':
+                self.skip_string()
+                continue
+            self.pos += 1
+            depth += 1 if match.group() in "[{" else -1
+            if depth == 0:
+                return
+
+    def iter_object(self):
+        """Yield the keys of the object at the cursor; the caller consumes each value."""
+        self.expect("{")
+        if self.peek() == "}":
+            self.pos += 1
+            return
+        while True:
+            key = self.read_string()
+            self.expect(":")
+            yield key
+            separator = self.peek()
+            self.pos += 1
+            if separator == "}":
+                return
+            if separator != ",":
+                raise ValueError(f"Malformed notebook: unexpected {separator!r} in object")
+
+    def iter_array(self):
+        """Yield once per element of the array at the cursor; the caller consumes each element."""
+        self.expect("[")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield
+            separator = self.peek()
+            self.pos += 1
+            if separator == "]":
+                return
+            if separator != ",":
+                raise ValueError(f"Malformed notebook: unexpected {separator!r} in array")
+
+    def read_text(self):
+        """Read a cell source, stored either as one string or as a list of strings."""
+        if self.peek() == '"':
+            return self.read_string()
+        if self.peek() == "[":
+            return "".join(self.read_string() for _ in self.iter_array())
+        self.skip_value()
+        return ""
+
+
+def _iter_cells(reader):
+    """Yield (cell_type, source) for every cell of an nbformat 4 "cells" list or nbformat 3 worksheet."""
+    for _ in reader.iter_array():
+        cell_type, source = None, ""
+        for key in reader.iter_object():
+            if key == "cell_type":
+                cell_type = reader.read_string()
+            elif key in ("source", "input"):  # "input" holds code cells in nbformat 3
+                source = reader.read_text()
+            else:
+                reader.skip_value()  # outputs, attachments, metadata, ...
+        yield cell_type, source
+
+
+def _iter_worksheet_cells(reader):
+    """Yield the cells of every worksheet of an nbformat 3 notebook."""
+    for _ in reader.iter_array():
+        for key in reader.iter_object():
+            if key == "cells":
+                yield from _iter_cells(reader)
+            else:
+                reader.skip_value()
+
+
+def iter_notebook_cells(file_path, stream=None):
+    """
+    Stream the cells of a notebook without loading their outputs.
+
+    Yields (cell_number, cell_type, source) with 1-based cell numbers counted over
+    all cells, so they match the position of the cell in the notebook. The notebook
+    is read from stream when one is given (e.g. a blob read from git), otherwise
+    from file_path.
+    """
+    if stream is None:
+        with open(file_path, "r", encoding="utf-8") as notebook_file:
+            yield from iter_notebook_cells(file_path, notebook_file)
+        return
+    reader = NotebookReader(stream)
+    cell_number = 0
+    for key in reader.iter_object():
+        if key == "cells":
+            cells = _iter_cells(reader)
+        elif key == "worksheets":
+            cells = _iter_worksheet_cells(reader)
+        else:
+            reader.skip_value()
+            continue
+        for cell_type, source in cells:
+            cell_number += 1
+            yield cell_number, cell_type, source
+
+
+class ContinuationTracker:
+    """
+    Follows brackets, backslash continuations and triple-quoted strings line by
+    line, to tell whether a line starts a logical statement. Deliberately forgiving:
+    cells often hold code the tokenizer would reject.
+    """
+
+    def __init__(self):
+        self.depth = 0  # Open brackets
+        self.string = None  # Delimiter of the triple-quoted string being continued
+        self.backslash = False
+
+    @property
+    def continued(self):
+        """Does the next line continue the current logical statement?"""
+        return bool(self.depth or self.string or self.backslash)
+
+    def feed(self, line):
+        i, n = 0, len(line)
+        while i < n:
+            if self.string:
+                end = line.find(self.string, i)
+                while end > 0 and line[end - 1] == "\\" and not line[:end].endswith("\\\\"):
+                    end = line.find(self.string, end + 1)
+                if end < 0:
+                    break
+                i, self.string = end + 3, None
+                continue
+            char = line[i]
+            if char == "#":
+                break
+            if char in "\"'":
+                if line.startswith(char * 3, i):
+                    self.string, i = char * 3, i + 3
+                    continue
+                end = i + 1
+                while end < n and line[end] != char:
+                    end += 2 if line[end] == "\\" else 1
+                i = end + 1
+                continue
+            if char in "([{":
+                self.depth += 1
+            elif char in ")]}":
+                self.depth = max(0, self.depth - 1)
+            i += 1
+        # i < n only when a comment stopped the scan
+        self.backslash = not self.string and i >= n and line.rstrip().endswith("\\")
+
+
+def strip_magics(cell_source):
+    """
+    Replace IPython magics, shell escapes and help requests with `pass`.
+
+    Every line is kept (indentation included) so line numbers inside the cell
+    stay valid; cells run by a non-Python cell magic become comments. Only lines
+    starting a logical statement can be magics: a line continuing brackets or a
+    string (e.g. "    % modulus)") is Python.
+    """
+    lines = cell_source.splitlines()
+    if lines and lines[0].startswith("%%"):
+        magic = lines[0][2:].split(None, 1)[0] if lines[0][2:].strip() else ""
+        if magic not in PYTHON_CELL_MAGICS:
+            return "\n".join("# " + line for line in lines)
+        lines[0] = "# " + lines[0]
+    tracker = ContinuationTracker()
+    for i, line in enumerate(lines):
+        match = None if tracker.continued else MAGIC_LINE.match(line)
+        if match:
+            lines[i] = f"{match.group(1)}pass  # {line.strip()}"
+        else:
+            tracker.feed(line)
+    return "\n".join(lines)
+
+
+def notebook_to_source(file_path, stream=None):
+    """
+    Concatenate the code cells of a notebook into one Python source.
+
+    Returns (source_code, line_map) where line_map[lineno - 1] is the
+    (cell_number, line_in_cell) that produced that line of the source; the blank
+    line separating two cells maps to the last line of the cell above it.
+    """
+    source_lines = []
+    line_map = []
+    for cell_number, cell_type, source in iter_notebook_cells(file_path, stream):
+        if cell_type != "code":
+            continue
+        line_in_cell = 0
+        for line_in_cell, line in enumerate(strip_magics(source).splitlines(), 1):
+            source_lines.append(line)
+            line_map.append((cell_number, line_in_cell))
+        source_lines.append("")  # Keep cells apart
+        line_map.append((cell_number, max(line_in_cell, 1)))
+    return "\n".join(source_lines), line_map
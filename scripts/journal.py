@@ -0,0 +1,93 @@
+import time
+import sqlite3
+import threading
+from itertools import islice
+
+PENDING, CLONED, SCANNED, FAILED = "pending", "cloned", "scanned", "failed"
+
+
+class ProgressJournal:
+    """
+    Durable per-repository progress of a corpus run, kept in a SQLite file.
+
+    Every repository of the manifest is recorded once, in manifest order, as
+    pending; it then moves to cloned once checked out and to scanned or failed,
+    with the duration of its last attempt and the error of a failure. Each update
+    is committed immediately, so a run killed at any point resumes with the
+    repositories that were not scanned yet: pending ones, failed ones with fewer
+    than max_attempts attempts, and cloned ones whose scan was interrupted (those
+    count as an attempt too, so a repository that keeps crashing the run is
+    eventually given up on). Safe to use from several threads of one process.
+    """
+
+    BATCH_SIZE = 1000  # Manifest rows inserted per transaction
+
+    def __init__(self, path="progress.sqlite"):
+        self.path = path
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self.connection:
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS repos ("
+                " url TEXT PRIMARY KEY,"
+                " position INTEGER NOT NULL,"
+                " status TEXT NOT NULL,"
+                " attempts INTEGER NOT NULL DEFAULT 0,"
+                " started REAL,"
+                " duration REAL,"
+                " error TEXT)"
+            )
+
+    def add(self, repo_urls):
+        """Record the repositories of a manifest (a lazy iterable is fine); known ones keep their status."""
+        repo_urls = iter(repo_urls)
+        added = 0
+        while True:
+            batch = list(islice(repo_urls, self.BATCH_SIZE))
+            if not batch:
+                return added
+            with self.lock, self.connection:
+                position = self.connection.execute("SELECT COALESCE(MAX(position), -1) + 1 FROM repos").fetchone()[0]
+                cursor = self.connection.executemany(
+                    "INSERT OR IGNORE INTO repos (url, position, status) VALUES (?, ?, ?)",
+                    ((url, position + i, PENDING) for i, url in enumerate(batch)),
+                )
+                added += cursor.rowcount
+
+    def runnable(self, max_attempts):
+        """URLs still to be scanned, in manifest order."""
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT url FROM repos WHERE status != ? AND attempts < ? ORDER BY position",
+                (SCANNED, max_attempts),
+            ).fetchall()
+        return [url for url, in rows]
+
+    def counts(self):
+        """Number of repositories per status."""
+        with self.lock:
+            return dict(self.connection.execute("SELECT status, COUNT(*) FROM repos GROUP BY status").fetchall())
+
+    def _update(self, query, params):
+        with self.lock, self.connection:
+            self.connection.execute(query, params)
+
+    def start(self, repo_url):
+        self._update("UPDATE repos SET status = ?, attempts = attempts + 1, started = ?, error = NULL WHERE url = ?",
+                     (PENDING, time.time(), repo_url))
+
+    def cloned(self, repo_url):
+        self._update("UPDATE repos SET status = ? WHERE url = ?", (CLONED, repo_url))
+
+    def scanned(self, repo_url):
+        self._update("UPDATE repos SET status = ?, duration = ? - started WHERE url = ?",
+                     (SCANNED, time.time(), repo_url))
+
+    def failed(self, repo_url, error):
+        self._update("UPDATE repos SET status = ?, duration = ? - started, error = ? WHERE url = ?",
+                     (FAILED, time.time(), str(error), repo_url))
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
@@ -0,0 +1,213 @@
+import os
+import time
+import shutil
+import stat
+import threading
+from collections import Counter
+
+import git
+
+
+def remove_readonly(func, path, _):
+    """Clear the read-only flag and retry deletion (git marks pack files read-only)."""
+    os.chmod(path, stat.S_IWRITE)
+    func(path)
+
+
+def directory_size(path):
+    """Total size in bytes of the files under path."""
+    size = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                size += os.lstat(os.path.join(root, name)).st_size
+            except FileNotFoundError:
+                pass
+    return size
+
+
+class MirrorCache:
+    """
+    Persistent cache of bare mirror repositories, one per repository URL.
+
+    A repository is cloned with --mirror the first time it is requested and only
+    fetched incrementally afterwards, so re-scanning a corpus downloads just what
+    changed since the last run. In "sparse" mode the mirrors are partial clones
+    (--filter=blob:none): blobs are fetched lazily, and only for the files a
+    checkout actually needs. Scans work on detached worktrees added from the
+    mirror, which share its object store and are cheap to create and remove.
+
+    Using a mirror refreshes the modification time of its directory, which is used
+    as the recency for eviction: once the cache grows past max_bytes, the least
+    recently used mirrors that have no worktree checked out are removed until it is
+    back under the low-water mark.
+    """
+
+    def __init__(self, cache_dir=".mirrors", max_bytes=50 * 1024 ** 3, low_water=0.8,
+                 sparse_patterns=("*.py", "*.ipynb")):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.low_water = low_water
+        self.sparse_patterns = sparse_patterns
+        self.lock = threading.Lock()  # Guards sizes, worktrees, pins and url_locks
+        self.url_locks = {}  # mirror path -> lock serializing clone/fetch/worktree changes
+        self.worktrees = {}  # worktree path -> mirror path
+        self.pins = Counter()  # mirror path -> checkouts in progress or not yet released
+        os.makedirs(cache_dir, exist_ok=True)
+        self.sizes = {path: directory_size(path) for path in self._mirrors()}
+
+    @property
+    def size(self):
+        return sum(self.sizes.values())
+
+    def _mirrors(self):
+        """Yield the path of every mirror currently on disk (cache_dir/<owner>/<name>.git)."""
+        for owner in os.scandir(self.cache_dir):
+            if owner.is_dir():
+                for entry in os.scandir(owner.path):
+                    if entry.is_dir() and entry.name.endswith(".git"):
+                        yield entry.path
+
+    def mirror_path(self, repo_url):
+        parts = repo_url.rstrip("/").split("/")
+        name = parts[-1].replace(".git", "")
+        owner = parts[-2].split(":")[-1] if len(parts) > 1 else "_"
+        return os.path.join(self.cache_dir, owner, name + ".git")
+
+    def _url_lock(self, mirror):
+        with self.lock:
+            return self.url_locks.setdefault(mirror, threading.Lock())
+
+    def update(self, repo_url, mode="sparse"):
+        """Clone or incrementally fetch the mirror of a repository; returns its path, or None on failure."""
+        mirror = self.mirror_path(repo_url)
+        with self._url_lock(mirror):
+            if os.path.exists(mirror):
+                print(f"Fetching {repo_url} into {mirror}...")
+                try:
+                    git.Git(mirror).fetch("--prune", "origin")
+                except Exception as e:
+                    # A stale mirror is still worth scanning
+                    print(f"Failed to fetch {repo_url}, using the cached mirror: {e}")
+            else:
+                print(f"Mirroring {repo_url} into {mirror}...")
+                try:
+                    self._clone(repo_url, mirror, mode)
+                except Exception as e:
+                    print(f"Failed to mirror {repo_url}: {e}")
+                    return None
+            os.utime(mirror)  # Mark as recently used
+            size = directory_size(mirror)
+        with self.lock:
+            self.sizes[mirror] = size
+        if self.size > self.max_bytes:
+            self.evict(keep=(mirror,))
+        return mirror
+
+    def _clone(self, repo_url, mirror, mode):
+        if mode == "sparse":
+            try:
+                git.Repo.clone_from(repo_url, mirror, mirror=True, filter="blob:none")
+                return
+            except git.GitCommandError as e:
+                # Old git, or a server without partial clone support: mirror everything
+                print(f"Partial mirror of {repo_url} failed ({str(e.stderr).strip()}); falling back to a full mirror")
+                if os.path.exists(mirror):
+                    shutil.rmtree(mirror, onerror=remove_readonly)
+        git.Repo.clone_from(repo_url, mirror, mirror=True)
+
+    def acquire(self, repo_url, mode="sparse"):
+        """
+        Update the mirror of a repository and return its path for scanning it
+        without a checkout (see RepoIndex's commit), or None on failure. The mirror
+        is not evicted until it is passed to release().
+        """
+        mirror = self.mirror_path(repo_url)
+        self._pin(mirror, 1)
+        if self.update(repo_url, mode) is None:
+            self._pin(mirror, -1)
+            return None
+        return mirror
+
+    def checkout(self, repo_url, worktree, mode="sparse"):
+        """
+        Update the mirror of a repository and check its HEAD out at worktree.
+
+        In "sparse" mode only files matching sparse_patterns are checked out. Returns
+        the worktree path, or None on failure; pass it to release() once scanned.
+        """
+        mirror = self.acquire(repo_url, mode)  # Never evicted while in use
+        if mirror is None:
+            return None
+        # Plain command runners: once a sparse worktree exists, core.bare lives in the
+        # mirror's config.worktree, which git.Repo does not read
+        repo = git.Git(mirror)
+        with self._url_lock(mirror):
+            if os.path.exists(worktree):
+                # Left over by an interrupted run
+                shutil.rmtree(worktree, onerror=remove_readonly)
+            try:
+                repo.worktree("prune")
+                repo.worktree("add", "--no-checkout", "--detach", os.path.abspath(worktree), "HEAD")
+                with self.lock:
+                    self.worktrees[worktree] = mirror
+                checkout = git.Git(worktree)
+                if mode == "sparse":
+                    checkout.sparse_checkout("set", "--no-cone", *self.sparse_patterns)
+                checkout.checkout()
+            except Exception as e:
+                print(f"Failed to check out {repo_url} into {worktree}: {e}")
+                self._remove_worktree(repo, worktree)
+                self._pin(mirror, -1)
+                return None
+        return worktree
+
+    def _pin(self, mirror, count):
+        with self.lock:
+            self.pins[mirror] += count
+            if self.pins[mirror] <= 0:
+                del self.pins[mirror]
+
+    def _remove_worktree(self, repo, worktree):
+        try:
+            repo.worktree("remove", "--force", os.path.abspath(worktree))
+        except git.GitCommandError:
+            if os.path.exists(worktree):
+                shutil.rmtree(worktree, onerror=remove_readonly)
+            repo.worktree("prune")
+        with self.lock:
+            self.worktrees.pop(worktree, None)
+
+    def release(self, path):
+        """Remove a worktree created by checkout(), or unpin a mirror returned by acquire(); mirrors stay cached."""
+        with self.lock:
+            mirror = self.worktrees.get(path)
+        if mirror is None:
+            self._pin(path, -1)  # A mirror path from acquire()
+            return
+        try:
+            with self._url_lock(mirror):
+                self._remove_worktree(git.Git(mirror), path)
+            print(f"Removed worktree: {path}")
+        except Exception as e:
+            print(f"Failed to remove worktree {path}: {e}")
+        finally:
+            self._pin(mirror, -1)
+
+    def evict(self, keep=()):
+        """Remove least recently used mirrors, except those in keep, until the cache is under the low-water mark."""
+        with self.lock:
+            candidates = [path for path in self.sizes if path not in self.pins and path not in keep]
+        candidates.sort(key=lambda path: os.stat(path).st_mtime if os.path.exists(path) else 0)
+        target = self.max_bytes * self.low_water
+        for mirror in candidates:
+            if self.size <= target:
+                break
+            with self._url_lock(mirror):
+                with self.lock:
+                    if mirror in self.pins or mirror not in self.sizes:
+                        continue  # Checked out or evicted since the candidates were listed
+                print(f"Evicting mirror {mirror} (last used {time.ctime(os.stat(mirror).st_mtime)})")
+                shutil.rmtree(mirror, onerror=remove_readonly)
+                with self.lock:
+                    self.sizes.pop(mirror, None)
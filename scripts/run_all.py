@@ -35,24 +35,83 @@ import git
 import time
 import shutil
 import stat
+import csv
+import json
+import queue
+import argparse
+import threading
+import functools
+import contextlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import openpyxl
 
 DETECTION_DIR = os.path.join(os.path.dirname(__file__), r"../detection")  
 sys.path.append(os.path.abspath(DETECTION_DIR))  
+sys.path.append(os.path.abspath(os.path.join(DETECTION_DIR, "..")))  # Package root, for "detection.common"
+
+from detection.common import RepoIndex
+from detection.cache import ASTCache
+from detection.output import set_excel_lock
+from mirrors import MirrorCache
+from journal import ProgressJournal
 
 EXCEL_FILE = r"repos_data.xlsx"  # Path to your Excel file
+URL_COLUMNS = ("repo", "GitHub_URL", "GitHub URL")  # Accepted names of the manifest's URL column
+# Per-repository progress of the corpus run; re-running resumes where the last run stopped
+JOURNAL_FILE = r"progress.sqlite"
+MAX_ATTEMPTS = int(os.getenv("MLMISFINDER_MAX_ATTEMPTS", 3))  # A failing repository is tried at most this many times
 CLONE_DIR =  r"repos"   # Directory to store cloned repos
-
-def clone_repo(repo_url):
+AST_CACHE_DIR = r".ast_cache"  # Parsed ASTs reused across runs, keyed by file content
+AST_CACHE_MAX_BYTES = 2 * 1024 ** 3  # Least recently used entries are evicted past this size
+PARSE_WORKERS = int(os.getenv("MLMISFINDER_PARSE_WORKERS", os.cpu_count() or 1))  # Processes used to parse large repos
+# Pipelined mode (--pipeline): repos are cloned ahead by CLONE_WORKERS threads while
+# SCAN_WORKERS processes run the detectors; at most SCAN_WORKERS + PIPELINE_DEPTH
+# repos are on disk at any time
+CLONE_WORKERS = int(os.getenv("MLMISFINDER_CLONE_WORKERS", 4))
+SCAN_WORKERS = int(os.getenv("MLMISFINDER_SCAN_WORKERS", os.cpu_count() or 1))
+PIPELINE_DEPTH = int(os.getenv("MLMISFINDER_PIPELINE_DEPTH", 2))
+# "sparse": depth-1, blob-filtered clone checking out only SPARSE_PATTERNS, falling back
+# to a full clone if that fails; "full": complete clone with history and every file
+CLONE_MODE = os.getenv("MLMISFINDER_CLONE_MODE", "sparse")
+SPARSE_PATTERNS = ("*.py", "*.ipynb")  # The only files the detectors read
+# Bare mirrors kept across runs and only fetched incrementally; scans use worktrees added
+# from them. Least recently used mirrors are evicted past MIRROR_MAX_BYTES
+MIRROR_DIR = os.getenv("MLMISFINDER_MIRROR_DIR", r".mirrors")
+MIRROR_MAX_BYTES = int(os.getenv("MLMISFINDER_MIRROR_MAX_BYTES", 50 * 1024 ** 3))
+
+def sparse_clone(repo_url, repo_path):
+    """
+    Clone only what a scan needs: the last commit, without history, and only the
+    blobs of files matching SPARSE_PATTERNS (other blobs are never downloaded when
+    the server supports partial clone; otherwise they are fetched but not checked out).
+    """
+    repo = git.Repo.clone_from(repo_url, repo_path, depth=1, filter="blob:none", no_checkout=True)
+    repo.git.sparse_checkout("set", "--no-cone", *SPARSE_PATTERNS)
+    repo.git.checkout()
+    return repo
+
+def clone_repo(repo_url, clone_dir=CLONE_DIR, mode=CLONE_MODE):
     """Clone a repository from GitHub into the repos directory."""
     repo_name = repo_url.rstrip("/").split("/")[-1].replace(".git", "")  # Ensure no trailing slash, remove .git if present
-    repo_path = os.path.join(CLONE_DIR, repo_name)
+    repo_path = os.path.join(clone_dir, repo_name)
 
     if os.path.exists(repo_path):
         print(f"Repository {repo_name} already cloned. Skipping...")
     else:
         print(f"Cloning {repo_url} into {repo_path}...")
         try:
-            git.Repo.clone_from(repo_url, repo_path)
+            if mode == "sparse":
+                try:
+                    sparse_clone(repo_url, repo_path)
+                except git.GitCommandError as e:
+                    # Old git, or a server refusing shallow clones: retry with a plain clone
+                    print(f"Sparse clone of {repo_url} failed ({str(e.stderr).strip()}); falling back to a full clone")
+                    if os.path.exists(repo_path):
+                        shutil.rmtree(repo_path, onerror=remove_readonly)
+                    git.Repo.clone_from(repo_url, repo_path)
+            else:
+                git.Repo.clone_from(repo_url, repo_path)
         except Exception as e:
             print(f"Failed to clone {repo_url}: {e}")
             return None
@@ -72,6 +131,77 @@ def delete_repo(repo_path):
     except Exception as e:
         print(f"Failed to delete {repo_path}: {e}")
 
+def checkout_repo(repo_url, clone_dir=CLONE_DIR, mode=CLONE_MODE, mirrors=None, commit=None):
+    """
+    Check a repository out for scanning: a worktree of its cached mirror, or a fresh
+    clone without mirrors. With a commit, the mirror itself is returned, to be read
+    from its object database without any checkout.
+    """
+    if mirrors is None:
+        return clone_repo(repo_url, clone_dir, mode)
+    if commit is not None:
+        return mirrors.acquire(repo_url, mode)
+    repo_name = repo_url.rstrip("/").split("/")[-1].replace(".git", "")
+    return mirrors.checkout(repo_url, os.path.join(clone_dir, repo_name), mode)
+
+def release_repo(repo_path, mirrors=None):
+    """Remove a checkout made by checkout_repo; mirrors stay cached."""
+    if mirrors is None:
+        delete_repo(repo_path)
+    else:
+        mirrors.release(repo_path)
+
+def _csv_rows(path):
+    with open(path, newline="", encoding="utf-8") as manifest:
+        yield from csv.reader(manifest)
+
+def _xlsx_rows(path):
+    workbook = openpyxl.load_workbook(path, read_only=True)  # Streams rows instead of loading the sheet
+    try:
+        yield from workbook.active.iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+def iter_manifest(path, column=None):
+    """
+    Lazily yield the repository URLs of a manifest: an .xlsx sheet, a .csv file, or a
+    .jsonl file of objects (or of bare URL strings). The URL column is column, or the
+    first of URL_COLUMNS found in the header; empty cells are skipped.
+    """
+    columns = (column,) if column else URL_COLUMNS
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".jsonl":
+        with open(path, encoding="utf-8") as manifest:
+            for line in manifest:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                url = record if isinstance(record, str) else next((record[c] for c in columns if record.get(c)), None)
+                if isinstance(url, str) and url.strip():
+                    yield url.strip()
+        return
+
+    if extension == ".csv":
+        rows = _csv_rows(path)
+    elif extension in (".xlsx", ".xlsm"):
+        rows = _xlsx_rows(path)
+    else:
+        raise ValueError(f"Unsupported manifest format: {path} (expected .xlsx, .csv or .jsonl)")
+    with contextlib.closing(rows):
+        header = [str(name).strip() if name is not None else "" for name in next(rows, ())]
+        position = next((header.index(c) for c in columns if c in header), None)
+        if position is None:
+            raise ValueError(f"{path} has no URL column (looked for {', '.join(columns)})")
+        for row in rows:
+            url = row[position] if position < len(row) else None
+            if isinstance(url, str) and url.strip():
+                yield url.strip()
+
+def repo_owner(repo_url):
+    """Owner part of a repository URL ("https://github.com/owner/name" -> "owner")."""
+    parts = repo_url.rstrip("/").split("/")
+    return parts[-2].split(":")[-1] if len(parts) > 1 else ""
+
   
 import os
 import pandas as pd
@@ -105,13 +235,24 @@ def save_results_to_excel(results, file_name):
         print(f"❌ Error saving results: {e}")
 
 
-def run_detections(repo_path):
-    """Run all detection scripts on the given repo and measure execution time."""
+def scan_repo(repo_path, ast_cache=None, parse_workers=PARSE_WORKERS, commit=None):
+    """
+    Run all detection scripts on the given repo and measure execution time; returns (results, total time,
+    failures), failures being the "<detection file>: <error>" of every detector that raised.
+    With a commit, the files are read from the repository's object database instead of its working tree.
+    """
     detection_files = [f for f in os.listdir(DETECTION_DIR) if f.startswith("detection_") and f.endswith(".py")]
     
     detection_results = []  # List to store execution time and results
+    failures = []  # Detectors that raised; the others still report
     total_detection_time = 0  # Total execution time for all detection scripts
 
+    # Walk and parse the repository once; every detector reuses the same index
+    start_time = time.time()
+    index = RepoIndex(repo_path, ast_cache, parse_workers, commit=commit)
+    print(f"Parsed {len(index.trees)} of {len(index.files)} Python files of {index.label} "
+          f"({len(index.irrelevant)} without ML imports) in {time.time() - start_time:.4f} seconds")
+
     for file in detection_files:
         module_name = file[:-3]  
         detection_module = importlib.import_module(module_name)  
@@ -121,7 +262,7 @@ def run_detections(repo_path):
             start_time = time.time()  # Start timing
             
             try:
-                result = detection_module.detect(repo_path)
+                result = detection_module.detect(index)
                 end_time = time.time()  # End timing
                 
                 execution_time = end_time - start_time  # Calculate execution time
@@ -132,7 +273,7 @@ def run_detections(repo_path):
 
                 # Store the data in a structured format
                 detection_results.append({
-                    "repo_name": os.path.basename(repo_path),
+                    "repo_name": os.path.basename(index.label),
                     "misuse_name": file,  # Detection file name as misuse identifier
                     "execution_time": round(execution_time, 4),
                     "result": [{k: v for k, v in result.items() if k != "repo_path"} for result in result]  # Can be extended with more details if needed
@@ -140,9 +281,13 @@ def run_detections(repo_path):
 
             except Exception as e:
                 print(f"Error running {file} on {repo_path}: {e}")
+                failures.append(f"{file}: {e}")
 
     print(f"Total execution time for all detection scripts on {repo_path}: {total_detection_time:.4f} seconds\n")
-    
+    return detection_results, total_detection_time, failures
+
+
+def save_final_report(detection_results):
     # Save results to Excel
     save_results_to_excel(detection_results, "final_report.xlsx")
     if os.path.exists("final_report.xlsx"):
@@ -150,24 +295,206 @@ def run_detections(repo_path):
     else:
         print("❌ final_report.xlsx was NOT created.")
 
-    return total_detection_time
 
-if __name__ == "__main__":
-    # Load repository URLs from Excel
-    df = pd.read_excel(EXCEL_FILE)
-    if "repo" not in df.columns:
-        print("Error: Excel file must contain a column named 'repo'")
-        sys.exit(1)
+def run_detections(repo_path, ast_cache=None, commit=None):
+    """Run all detection scripts on the given repo, save the report and return (total execution time, failures)."""
+    detection_results, total_detection_time, failures = scan_repo(repo_path, ast_cache, commit=commit)
+    save_final_report(detection_results)
+    return total_detection_time, failures
 
-    os.makedirs(CLONE_DIR, exist_ok=True)  # Ensure repos folder exists
-    df = df.iloc[1078:]  
 
-    df = df.dropna(subset=["repo"])  
-    for repo_url in df["repo"].dropna():
-        repo_path = clone_repo(repo_url)
-        if repo_path:
-            run_detections(repo_path)
+def run_sequential(repo_urls, ast_cache=None, clone_mode=CLONE_MODE, mirrors=None, commit=None, journal=None):
+    """
+    Check out, scan and remove one repository after the other, recording progress in the journal.
+    A repository where any detector failed is journaled as failed, with the detectors' errors.
+    """
+    journal = journal or ProgressJournal(":memory:")
+    for repo_url in repo_urls:
+        journal.start(repo_url)
+        try:
+            repo_path = checkout_repo(repo_url, mode=clone_mode, mirrors=mirrors, commit=commit)
+        except Exception as e:
+            print(f"Error checking out {repo_url}: {e}")
+            journal.failed(repo_url, e)
+            continue
+        if not repo_path:
+            journal.failed(repo_url, "clone failed")
+            continue
+        journal.cloned(repo_url)
+        try:
+            _, failures = run_detections(repo_path, ast_cache, commit)
+        except Exception as e:
+            print(f"Error scanning {repo_path}: {e}")
+            journal.failed(repo_url, e)
+        else:
+            if failures:
+                journal.failed(repo_url, "; ".join(failures))
+            else:
+                journal.scanned(repo_url)
+        finally:
             print(f"Deleting repo: {repo_path}")  # Debugging
-            delete_repo(repo_path)
+            release_repo(repo_path, mirrors)
+
+
+def run_pipeline(repo_urls, ast_cache=None, clone_workers=CLONE_WORKERS, scan_workers=SCAN_WORKERS,
+                 depth=PIPELINE_DEPTH, clone_mode=CLONE_MODE, mirrors=None, commit=None, journal=None):
+    """
+    Clone, scan and delete repositories concurrently.
+
+    With mirrors, "cloning" fetches the repository's mirror and adds a worktree
+    from it, and "deleting" removes the worktree only; with a commit as well, scans
+    read the mirror's object database and nothing is checked out.
+
+    clone_workers threads clone ahead while a pool of scan_workers processes runs the
+    detectors on repositories that are already cloned, and a background thread
+    deletes scanned repositories. Cloning a new repository waits for a free slot, so
+    at most scan_workers + depth repositories are on disk at any time. Each scan
+    parses with a single process; parallelism comes from scanning several
+    repositories at once. The final report and the journal are written by this
+    process only, as results arrive; a repository where any detector failed is
+    journaled as failed, like in run_sequential.
+    """
+    journal = journal or ProgressJournal(":memory:")
+    repo_urls = iter(repo_urls)
+    urls_lock = threading.Lock()
+    slots = threading.BoundedSemaphore(scan_workers + depth)  # Repositories allowed on disk
+    finished = queue.Queue()  # (repo_url, repo_path, future) per scan; None when a clone worker is done
+    submitted = [0]  # Scans started, updated under urls_lock
+
+    def release(repo_path):
+        try:
+            release_repo(repo_path, mirrors)
+        finally:
+            slots.release()
+
+    # Scan workers are spawned, not forked: a fork taken while a clone thread runs git would
+    # inherit that subprocess's pipes and keep the thread waiting for their end forever
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(scan_workers, context, initializer=set_excel_lock, initargs=(context.Lock(),)) as scan_pool, \
+            ThreadPoolExecutor(1, thread_name_prefix="delete") as deleter:
+
+        def scanned(repo_url, repo_path, future):
+            deleter.submit(release, repo_path)  # Before reporting, so the deletion is queued when the run ends
+            finished.put((repo_url, repo_path, future))
+
+        def clone_worker():
+            try:
+                while True:
+                    with urls_lock:
+                        repo_url = next(repo_urls, None)
+                    if repo_url is None:
+                        return
+                    slots.acquire()
+                    repo_path, scanning = None, False
+                    try:
+                        journal.start(repo_url)
+                        # One directory per owner, so that same-named repositories cloned concurrently do not collide
+                        repo_path = checkout_repo(repo_url, os.path.join(CLONE_DIR, repo_owner(repo_url)), clone_mode,
+                                                  mirrors, commit)
+                        if repo_path is None:
+                            journal.failed(repo_url, "clone failed")
+                            continue
+                        journal.cloned(repo_url)
+                        future = scan_pool.submit(scan_repo, repo_path, ast_cache, 1, commit)
+                        scanning = True  # From here on, the slot is given back once the scan is done
+                    except Exception as e:
+                        # Keep the worker alive; the repository is retried on the next pass
+                        print(f"Error preparing {repo_url}: {e}")
+                        journal.failed(repo_url, e)
+                        continue
+                    finally:
+                        # Exactly one release of the slot, even if journaling the failure raised
+                        if not scanning:
+                            if repo_path is None:
+                                slots.release()
+                            else:
+                                deleter.submit(release, repo_path)
+                    with urls_lock:
+                        submitted[0] += 1
+                    future.add_done_callback(functools.partial(scanned, repo_url, repo_path))
+            finally:
+                finished.put(None)
+
+        for _ in range(clone_workers):
+            threading.Thread(target=clone_worker, daemon=True).start()
+
+        running, done = clone_workers, 0
+        while running or done < submitted[0]:
+            item = finished.get()
+            if item is None:
+                running -= 1
+                continue
+            done += 1
+            repo_url, repo_path, future = item
+            try:
+                detection_results, total_detection_time, failures = future.result()
+            except Exception as e:
+                print(f"Error scanning {repo_path}: {e}")
+                journal.failed(repo_url, e)
+                continue
+            if failures:
+                journal.failed(repo_url, "; ".join(failures))
+            else:
+                journal.scanned(repo_url)
+            print(f"Scanned {repo_path} in {total_detection_time:.4f} seconds ({done} done)")
+            save_final_report(detection_results)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Clone repositories and run every detector on them.")
+    parser.add_argument("--repo", action="append", default=[],
+                        help="Repository URL to scan instead of the manifest (repeatable; file:// URLs work); "
+                             "progress is then not journaled")
+    parser.add_argument("--manifest", default=EXCEL_FILE, help="Repository list: an .xlsx, .csv or .jsonl file")
+    parser.add_argument("--column", help=f"URL column of the manifest (default: the first of {', '.join(URL_COLUMNS)})")
+    parser.add_argument("--journal", default=JOURNAL_FILE,
+                        help="Progress journal; runs with the same journal resume where the last one stopped")
+    parser.add_argument("--max-attempts", type=int, default=MAX_ATTEMPTS,
+                        help="Attempts per repository, across runs, before it is given up on")
+    parser.add_argument("--pipeline", action="store_true", help="Clone, scan and delete repositories concurrently")
+    parser.add_argument("--clone-workers", type=int, default=CLONE_WORKERS)
+    parser.add_argument("--scan-workers", type=int, default=SCAN_WORKERS)
+    parser.add_argument("--depth", type=int, default=PIPELINE_DEPTH,
+                        help="Cloned repositories allowed to wait for a scan worker")
+    parser.add_argument("--clone-mode", choices=["sparse", "full"], default=CLONE_MODE,
+                        help="sparse: shallow, blob-filtered clone of *.py and *.ipynb files only")
+    parser.add_argument("--mirror-dir", default=MIRROR_DIR, help="Cache of bare mirrors reused across runs")
+    parser.add_argument("--no-mirrors", action="store_true",
+                        help="Clone every repository from scratch and delete it after the scan")
+    parser.add_argument("--commit", help="Scan this revision (e.g. HEAD, a tag or a SHA) straight from each "
+                                         "mirror's object database, without checking anything out")
+    args = parser.parse_args(argv)
+    if args.commit and args.no_mirrors:
+        parser.error("--commit reads from the mirrors and cannot be used with --no-mirrors")
+    return args
 
 
+if __name__ == "__main__":
+    args = parse_args()
+    # Repositories given with --repo are an ad-hoc run: they neither join nor resume the corpus journal
+    journal_path = ":memory:" if args.repo else args.journal
+    journal = ProgressJournal(journal_path)
+    try:
+        added = journal.add(args.repo or iter_manifest(args.manifest, args.column))
+    except (OSError, ValueError) as e:
+        print(f"Error reading {args.manifest}: {e}")
+        sys.exit(1)
+    print(f"{added} new repositories added to {journal_path}: {journal.counts()}")
+
+    os.makedirs(CLONE_DIR, exist_ok=True)  # Ensure repos folder exists
+    ast_cache = ASTCache(AST_CACHE_DIR, AST_CACHE_MAX_BYTES)
+    mirrors = None if args.no_mirrors else MirrorCache(args.mirror_dir, MIRROR_MAX_BYTES, sparse_patterns=SPARSE_PATTERNS)
+
+    # Every pass makes one more attempt at each repository still to scan, so failures are retried up to the cap
+    for attempt in range(1, args.max_attempts + 1):
+        repo_urls = journal.runnable(args.max_attempts)
+        if not repo_urls:
+            break
+        print(f"Pass {attempt}: {len(repo_urls)} repositories to scan")
+        if args.pipeline:
+            run_pipeline(repo_urls, ast_cache, args.clone_workers, args.scan_workers, args.depth, args.clone_mode,
+                         mirrors, args.commit, journal)
+        else:
+            run_sequential(repo_urls, ast_cache, args.clone_mode, mirrors, args.commit, journal)
+    print(f"Journal {journal_path}: {journal.counts()}")
+    journal.close()
@@ -0,0 +1,37 @@
+import os
+import sys
+import subprocess
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "scripts"))
+
+import run_all
+from journal import ProgressJournal
+
+
+def make_repo(path):
+    """A local git repository with one file the detectors parse; returns its file:// URL."""
+    os.makedirs(path)
+    with open(os.path.join(path, "score.py"), "w", encoding="utf-8") as source:
+        source.write("import boto3\n\nclient = boto3.client('comprehend')\n"
+                     "for text in texts:\n    client.detect_sentiment(Text=text)\n")
+    for command in (["init", "-q"], ["add", "score.py"],
+                    ["-c", "user.name=test", "-c", "user.email=test@example.com", "commit", "-q", "-m", "init"]):
+        subprocess.run(["git", "-C", path, *command], check=True)
+    return "file://" + os.path.abspath(path)
+
+
+def test_pipeline_scans_local_repositories(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # Checkouts and reports are written to the working directory
+    repo_url = make_repo(str(tmp_path / "owner" / "repo"))
+    missing_url = "file://" + str(tmp_path / "owner" / "missing")
+    journal = ProgressJournal(":memory:")
+    journal.add([missing_url, repo_url])
+
+    # A single slot: a slot leaked by the failed clone would hang the run
+    run_all.run_pipeline(journal.runnable(1), clone_workers=1, scan_workers=1, depth=0, clone_mode="full",
+                         mirrors=None, journal=journal)
+
+    assert journal.counts() == {"failed": 1, "scanned": 1}
+    assert journal.runnable(2) == [missing_url]
+    assert os.path.exists("final_report.xlsx")
+    assert not os.path.exists(os.path.join(run_all.CLONE_DIR, "owner", "repo"))  # Removed once scanned